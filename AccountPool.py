@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import deque
+
+import requests
+
+# B站接口返回的限流/风控错误码
+THROTTLE_CODES = (-412, -352, -509, -799)
+
+
+class Account:
+    """
+    账号池中的单个账号
+    每个账号使用独立的会话，并记录登录状态缓存、最近请求时间和限流状态
+    """
+
+    def __init__(self, sessdata, headers, session=None):
+        """
+        Args:
+            sessdata (str): 账号的SESSDATA
+            headers (dict): 请求头
+            session (requests.Session, optional): 使用的会话，缺省时新建
+        """
+        self.sessdata = sessdata
+        self.session = session or requests.Session()
+        self.session.headers.update(headers)
+        self.session.cookies.set('SESSDATA', sessdata)
+
+        self.logged_in = False
+        self.uname = ""
+        self.login_checked_at = None
+
+        self.request_times = deque()
+        self.parked_until = 0
+        self.throttle_count = 0
+
+    @property
+    def label(self):
+        return self.uname or f"SESSDATA...{self.sessdata[-6:]}"
+
+    def check_login(self, ttl, log=print):
+        """
+        检查登录状态，ttl秒内使用缓存结果；重新检查时输出检查结果
+
+        Args:
+            ttl (int): 登录状态缓存秒数
+            log (callable): 日志输出函数
+
+        Returns:
+            bool: 是否已登录
+        """
+        if self.login_checked_at is not None and time.monotonic() - self.login_checked_at < ttl:
+            return self.logged_in
+        try:
+            response = self.session.get("https://api.bilibili.com/x/web-interface/nav", timeout=10)
+            data = response.json()
+            self.logged_in = data["code"] == 0 and data["data"]["isLogin"]
+            if self.logged_in:
+                self.uname = data["data"]["uname"]
+                log(f"账号池: {self.label} 登录有效")
+            else:
+                log(f"账号池: {self.label} 未登录或SESSDATA已失效")
+        except Exception as e:
+            log(f"检查账号登录状态失败: {e}")
+            self.logged_in = False
+        self.login_checked_at = time.monotonic()
+        return self.logged_in
+
+
+class AccountPool:
+    """
+    多账号SESSDATA池
+    将元数据和playurl请求分散到多个账号，按账号统计请求频率，
+    遇到-412/-352等限流错误码的账号会暂停使用一段时间
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, sessdata_list, headers, options=None, transport=None):
+        """
+        Args:
+            sessdata_list (list): SESSDATA列表
+            headers (dict): 请求头
+            options (dict, optional): 配置项accounts
+            transport (Transport, optional): 共享的传输层，各账号会话复用其连接池
+        """
+        options = options or {}
+        self.transport = transport
+        self.window_seconds = options.get('window_seconds', 60)
+        self.max_requests = options.get('max_requests', 30)
+        self.park_seconds = options.get('park_seconds', 300)
+        self.login_ttl = options.get('login_ttl', 1800)
+
+        self.accounts = [Account(sessdata, headers, transport.new_session() if transport else None)
+                         for sessdata in sessdata_list]
+        self.lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, sessdata_list, headers, options=None, transport=None):
+        """
+        获取同一组SESSDATA对应的共享账号池，使同一进程内的多个下载任务共享请求统计
+
+        Returns:
+            AccountPool: 账号池
+        """
+        key = tuple(sessdata_list)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(sessdata_list, headers, options, transport)
+            return cls._instances[key]
+
+    def any_logged_in(self, log=print):
+        """
+        检查所有账号的登录状态（使用缓存），返回是否至少有一个账号登录有效
+
+        Args:
+            log (callable): 日志输出函数
+        """
+        results = [account.check_login(self.login_ttl, log) for account in self.accounts]
+        return any(results)
+
+    def _acquire(self, log=print):
+        """
+        选择一个可用账号：未被暂停、未超出请求频率且最近请求最少的账号；
+        存在登录有效的账号时只使用这些账号，未登录的账号仅在没有任何登录有效账号时使用；
+        所有账号都不可用时等待最早可用的账号
+
+        Returns:
+            Account: 选中的账号
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                available = []
+                wait_until = None
+                candidates = [account for account in self.accounts if account.logged_in] or self.accounts
+                for account in candidates:
+                    while account.request_times and now - account.request_times[0] >= self.window_seconds:
+                        account.request_times.popleft()
+
+                    ready_at = account.parked_until
+                    if self.max_requests and len(account.request_times) >= self.max_requests:
+                        ready_at = max(ready_at, account.request_times[0] + self.window_seconds)
+                    if ready_at <= now:
+                        available.append(account)
+                    elif wait_until is None or ready_at < wait_until:
+                        wait_until = ready_at
+
+                if available:
+                    account = min(available, key=lambda a: len(a.request_times))
+                    account.request_times.append(now)
+                    return account
+
+            log(f"账号池中所有账号都在限流或达到请求上限，等待 {wait_until - now:.0f} 秒")
+            time.sleep(max(0.1, wait_until - now))
+
+    def _report(self, account, throttled, log=print):
+        """
+        记录请求结果，被限流的账号按连续限流次数指数延长暂停时间
+        """
+        with self.lock:
+            if throttled:
+                park = min(self.park_seconds * (2 ** account.throttle_count), self.park_seconds * 16)
+                account.throttle_count += 1
+                account.parked_until = time.monotonic() + park
+                log(f"账号 {account.label} 触发限流，暂停使用 {park} 秒")
+            else:
+                account.throttle_count = 0
+
+    @staticmethod
+    def _is_throttled(response):
+        if response.status_code == 412:
+            return True
+        if 'json' in response.headers.get('Content-Type', ''):
+            try:
+                return response.json().get("code") in THROTTLE_CODES
+            except ValueError:
+                return False
+        return False
+
+    def get(self, url, log=print, **kwargs):
+        """
+        通过账号池发送GET请求，被限流时换用其他账号重试
+
+        Args:
+            url (str): 请求地址
+            log (callable): 日志输出函数
+            **kwargs: 传递给requests的参数
+
+        Returns:
+            requests.Response: 响应
+        """
+        response = None
+        for _ in range(len(self.accounts) + 1):
+            account = self._acquire(log)
+            if self.transport:
+                response = self.transport.api_get(account.session, url, **kwargs)
+            else:
+                response = account.session.get(url, **kwargs)
+            throttled = self._is_throttled(response)
+            self._report(account, throttled, log)
+            if not throttled:
+                return response
+        return response
@@ -0,0 +1,263 @@
+import os
+import subprocess
+from shutil import which
+
+from AccountPool import AccountPool
+from Config import load_config, save_config, get_base_dir
+from Events import console_emitter
+from Transport import Transport
+
+
+class BilibiliClient:
+    """
+    B站客户端基类
+    负责视频下载器和直播录制器共用的初始化：事件分发、配置加载、请求会话与登录状态、FFmpeg验证
+    """
+
+    def __init__(self, cookie_path=None, events=None, interactive=True):
+        """
+        初始化客户端
+
+        Args:
+            cookie_path (str, optional): Cookie文件路径
+            events (EventEmitter, optional): 事件分发器，缺省时使用命令行界面输出日志和进度条
+            interactive (bool): 是否允许通过input()向用户提问，为False时使用默认选项
+        """
+        # 日志、进度和结果通过事件分发
+        self.events = events or console_emitter()
+        self.interactive = interactive
+
+        # 加载配置
+        self.config = load_config(self._log)
+
+        # 初始化请求会话并加载登录状态
+        self._init_session(cookie_path)
+
+        # 提取配置项
+        self.base_download_dir = os.path.join(get_base_dir(), self.config['base_download_dir'])
+        self.ffmpeg_path = self.config['ffmpeg']['path']
+
+        # 创建基础下载目录
+        os.makedirs(self.base_download_dir, exist_ok=True)
+
+        # 验证FFmpeg（必须在设置ffmpeg_path之后调用）
+        self._verify_ffmpeg()
+
+    def _log(self, message, level="info"):
+        """
+        发送日志事件
+
+        Args:
+            message (str): 日志内容
+            level (str): 日志级别：info、warning、error
+        """
+        self.events.log(message, level)
+
+    def _ask(self, prompt, default=""):
+        """
+        向用户提问，非交互模式下直接返回默认值
+
+        Args:
+            prompt (str): 提示内容
+            default (str): 非交互模式下的默认回答
+
+        Returns:
+            str: 用户输入（已去除首尾空白）
+        """
+        if not self.interactive:
+            return default
+        return input(prompt).strip()
+
+    def _init_session(self, cookie_path=None):
+        """
+        初始化请求会话并加载登录状态
+
+        Args:
+            cookie_path (str, optional): Cookie文件路径
+        """
+        # 同一进程内的下载任务共享连接池和DNS缓存，Cookie和请求头使用各自的会话
+        self.transport = Transport.shared(self.config.get('transport'), self._log)
+        self.session = self.transport.new_session()
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
+            'Referer': 'https://www.bilibili.com/',
+            'Accept-Language': 'zh-CN,zh;q=0.9'
+        }
+        self.session.headers.update(self.headers)
+
+        # 登录状态相关
+        self.logged_in = False
+        self.sessdata = ""
+        self.account_pool = None
+        self.load_cookies(cookie_path)
+
+    def _api_get(self, url, **kwargs):
+        """
+        发送元数据/playurl请求，配置了多账号时由账号池分配账号
+
+        Args:
+            url (str): 请求地址
+            **kwargs: 传递给requests的参数
+
+        Returns:
+            requests.Response: 响应
+        """
+        if self.account_pool:
+            return self.account_pool.get(url, log=self._log, **kwargs)
+        return self.transport.api_get(self.session, url, **kwargs)
+
+    def save_config(self):
+        """
+        保存配置到文件
+        """
+        save_config(self.config, self._log)
+
+    def _verify_ffmpeg(self):
+        """
+        验证FFmpeg是否可用
+        """
+        try:
+            ffmpeg_exe = self._ffmpeg_exe()
+
+            if not which(ffmpeg_exe) and not os.path.exists(ffmpeg_exe):
+                raise Exception(f"FFmpeg文件不存在: {ffmpeg_exe}")
+
+            result = subprocess.run(
+                [ffmpeg_exe, "-version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+
+            if result.returncode != 0:
+                raise Exception(f"FFmpeg运行失败: {result.stderr}")
+
+            self._log(f"已找到FFmpeg: {ffmpeg_exe}")
+            return True
+
+        except Exception as e:
+            self._log(f"FFmpeg验证失败: {e}", level="error")
+            self._log("请检查FFmpeg路径是否正确，或重新安装FFmpeg")
+            self._auto_config_ffmpeg()
+            return False
+
+    def _ffmpeg_exe(self):
+        """
+        获取FFmpeg可执行文件路径
+
+        Returns:
+            str: FFmpeg可执行文件路径，未配置目录时使用系统环境变量中的FFmpeg
+        """
+        exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+        return os.path.join(self.ffmpeg_path, exe_name) if self.ffmpeg_path else exe_name
+
+    def _auto_config_ffmpeg(self):
+        """
+        自动配置FFmpeg路径
+        """
+        system_ffmpeg = which('ffmpeg') or which('ffmpeg.exe')
+        if system_ffmpeg and os.path.exists(system_ffmpeg):
+            ffmpeg_bin_dir = os.path.dirname(system_ffmpeg)
+            self._log(f"自动找到了FFmpeg bin目录: {ffmpeg_bin_dir}")
+            self.ffmpeg_path = ffmpeg_bin_dir
+            self.config['ffmpeg']['path'] = ffmpeg_bin_dir
+            self.save_config()
+        else:
+            self._log("未找到FFmpeg的bin目录，请手动配置")
+            if not self.interactive:
+                self._log("非交互模式下无法手动配置FFmpeg，合并音视频将不可用")
+                return
+            while True:
+                user_input = self._ask("请手动输入FFmpeg的bin目录完整路径: ")
+                exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+                if user_input and os.path.exists(os.path.join(user_input, exe_name)):
+                    self.ffmpeg_path = user_input
+                    self._log(f"已使用手动输入的FFmpeg bin目录: {self.ffmpeg_path}")
+                    self.config['ffmpeg']['path'] = user_input
+                    self.save_config()
+                    break
+                else:
+                    self._log("输入的目录无效或不包含FFmpeg可执行文件，请重新输入")
+
+    def load_cookies(self, cookie_path=None):
+        """
+        加载Cookie，以sessdata为主
+
+        Args:
+            cookie_path (str, optional): Cookie文件路径
+        """
+        # 从配置文件加载sessdata
+        self.sessdata = self.config.get('sessdata', '').strip()
+
+        # 设置会话Cookie
+        if self.sessdata:
+            self.session.cookies.set('SESSDATA', self.sessdata)
+            self._log("已从配置文件加载SESSDATA")
+
+        # 配置了多个账号时，元数据和playurl请求由账号池分配
+        account_options = self.config.get('accounts', {})
+        sessdata_list = [item.strip() for item in account_options.get('sessdata_list') or [] if item and item.strip()]
+        if sessdata_list:
+            if self.sessdata and self.sessdata not in sessdata_list:
+                sessdata_list.insert(0, self.sessdata)
+            self.account_pool = AccountPool.shared(sessdata_list, self.headers, account_options, self.transport)
+            self.logged_in = self.account_pool.any_logged_in(self._log)
+            if not self.logged_in:
+                self._log("账号池中没有登录有效的账号，更高画质可能无法下载")
+            return
+
+        # 检查登录状态
+        self._check_login_status()
+
+        # 如果未登录，提示用户输入
+        if not self.logged_in:
+            self._log("未检测到有效登录状态，更高画质可能无法下载")
+            use_login = self._ask("是否要使用登录状态下载？(y/n): ", "n").lower()
+            if use_login == 'y':
+                self._log("请在浏览器中登录B站后，获取SESSDATA")
+                self._log("获取方法：F12打开开发者工具 -> Application -> Cookies -> .bilibili.com -> SESSDATA")
+                self.sessdata = self._ask("请输入SESSDATA值: ")
+                if self.sessdata:
+                    self.session.cookies.set('SESSDATA', self.sessdata)
+                    # 验证登录状态
+                    if self._check_login_status():
+                        # 保存到配置文件
+                        save_sess = self._ask("是否保存SESSDATA到配置文件？(y/n): ", "n").lower()
+                        if save_sess == 'y':
+                            self.config['sessdata'] = self.sessdata
+                            self.save_config()
+                            self._log("SESSDATA已保存到配置文件")
+                else:
+                    self._log("未输入有效的SESSDATA，将使用未登录状态")
+
+    def _check_login_status(self):
+        """
+        检查登录状态
+
+        Returns:
+            bool: 是否已登录
+        """
+        try:
+            url = "https://api.bilibili.com/x/web-interface/nav"
+            response = self.session.get(url, timeout=10)
+            data = response.json()
+
+            if data["code"] == 0 and data["data"]["isLogin"]:
+                self.logged_in = True
+                self._log(f"登录状态有效，当前用户: {data['data']['uname']}")
+                return True
+            else:
+                self._log("SESSDATA已过期或无效")
+                self.logged_in = False
+                return False
+        except Exception as e:
+            self._log(f"检查登录状态失败: {e}", level="error")
+            self.logged_in = False
+            return False
+
+    def _ffprobe_exe(self):
+        """
+        获取与FFmpeg同目录的FFprobe可执行文件路径
+        """
+        exe_name = "ffprobe.exe" if os.name == "nt" else "ffprobe"
+        return os.path.join(self.ffmpeg_path, exe_name) if self.ffmpeg_path else exe_name
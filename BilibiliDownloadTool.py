@@ -1,19 +1,28 @@
 import argparse
 
 from BilibiliDownloader import BilibiliDownloader
+from DownloadPipeline import DownloadPipeline
+from LiveRecorder import BilibiliLiveRecorder
 
 
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='B站视频下载工具')
-    parser.add_argument('-link', '--link', '-l', '--l', type=str, required=True, help='视频的BV号、AV号或完整链接')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('-link', '--link', '-l', '--l', type=str, nargs='+',
+                        help='视频的BV号、AV号或完整链接，传入多个时批量下载')
+    target.add_argument('-live', '--live', type=str, help='录制直播，直播间号或直播间链接')
 
     args = parser.parse_args()
 
     try:
         # 创建下载器实例并执行下载
-        downloader = BilibiliDownloader(args.link)
-        downloader.run()
+        if args.live:
+            BilibiliLiveRecorder(args.live).run()
+        elif len(args.link) > 1:
+            DownloadPipeline().run(args.link)
+        else:
+            BilibiliDownloader(args.link[0]).run()
     except Exception as e:
         print(f"下载失败: {str(e)}")
 
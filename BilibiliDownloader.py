@@ -2,14 +2,18 @@ import json
 import os
 import re
 import subprocess
-from shutil import which
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from Crypto.Cipher import AES
 from lxml import etree
-from tqdm import tqdm
 
-from Config import load_config, save_config, get_base_dir
+from BilibiliClient import BilibiliClient
+from Config import get_base_dir
+from ContentStore import ContentHasher, ContentStore
+from SideArtifactFetcher import SideArtifactFetcher
+from StorageManager import StorageManager
 
 DEFAULT_QUALITY_PRIORITY = {
     126: 9,  # 8K 超高清
@@ -38,66 +42,75 @@ DEFAULT_QUALITY_MAP = {
 }
 
 
-class BilibiliDownloader:
+class BilibiliDownloader(BilibiliClient):
     """
     B站视频下载器类
     支持下载B站视频，包括DASH和FLV格式
     """
 
-    def __init__(self, video_url, cookie_path=None):
+    def __init__(self, video_url, cookie_path=None, events=None, interactive=True):
         """
         初始化下载器
 
         Args:
             video_url (str): 视频的AV号、BV号或完整链接
             cookie_path (str, optional): Cookie文件路径
+            events (EventEmitter, optional): 事件分发器，缺省时使用命令行界面输出日志和进度条
+            interactive (bool): 是否允许通过input()向用户提问，为False时使用默认选项
         """
-        # 加载配置
-        self.config = load_config()
+        self.bytes_downloaded = 0
+        self._bytes_lock = threading.Lock()
+        self.status = None
 
         # 提取并初始化视频URL
         self.av_num = self._extract_av_bv(video_url.strip())
         self.url = f'https://www.bilibili.com/video/{self.av_num}'
 
-        # 初始化请求会话
-        self.session = requests.Session()
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
-            'Referer': 'https://www.bilibili.com/',
-            'Accept-Language': 'zh-CN,zh;q=0.9'
-        }
-        self.session.headers.update(self.headers)
-
-        # 登录状态相关
-        self.logged_in = False
-        self.sessdata = ""
-        self.load_cookies(cookie_path)
+        # 加载配置、初始化请求会话并验证FFmpeg
+        super().__init__(cookie_path, events, interactive)
 
         # 提取配置项
-        self.base_download_dir = os.path.join(get_base_dir(), self.config['base_download_dir'])
-        print(self.base_download_dir)
-        self.ffmpeg_path = self.config['ffmpeg']['path']
         self.quality_priority = self.config.get('quality_priority', DEFAULT_QUALITY_PRIORITY)
         self.quality_map = self.config.get('quality_map', DEFAULT_QUALITY_MAP)
         self.overwrite_existing = self.config['overwrite_strategy']['overwrite_existing']
         self.higher_quality_replace = self.config['overwrite_strategy']['higher_quality_replace']
-
-        # 创建基础下载目录
-        os.makedirs(self.base_download_dir, exist_ok=True)
-
-        # 验证FFmpeg（必须在设置ffmpeg_path之后调用）
-        self._verify_ffmpeg()
+        self.flv_segment_workers = self.config.get('flv_segment_workers', 4)
+        self.post_options = self.config.get('post_process', {})
+        self.side_artifacts = self.config.get('side_artifacts', {})
+        self.storage = StorageManager(self.config.get('storage'), self._log)
+        # DASH临时流文件目录（如高速SSD），为空时与成品放在同一目录
+        temp_dir = self.config.get('storage', {}).get('temp_dir', '')
+        self.temp_dir = os.path.join(get_base_dir(), temp_dir) if temp_dir else None
+
+        # 内容查重：下载文件路径 -> 内容指纹 / 重复的已有文件路径
+        dedup_options = self.config.get('dedup', {})
+        self.dedup_store = None
+        self.dedup_sample_bytes = int(dedup_options.get('sample_mb', 4)) * 1024 * 1024
+        if dedup_options.get('enabled'):
+            index_path = dedup_options.get('index_path') or os.path.join(self.base_download_dir, ".content_index.json")
+            self.dedup_store = ContentStore.open(index_path, self._log)
+        self.content_keys = {}
+        self.dedup_hits = {}
+        # 当前任务的输出文件，查重时不能把它当作已有的重复文件
+        self.output_path = None
+
+        # 页面中解析出的__INITIAL_STATE__，供附属资源下载复用
+        self.initial_state = {}
 
         # 获取网页响应
         try:
-            self.html_response = self.session.get(self.url, timeout=10)
+            self.html_response = self._api_get(self.url, timeout=10)
             self.html_response.raise_for_status()
             self.html_tree = etree.HTML(self.html_response.text)
         except Exception as e:
-            print(f"获取视频页面失败: {e}")
+            self._log(f"获取视频页面失败: {e}", level="error")
             self.html_response = None
             self.html_tree = None
 
+    def _add_downloaded_bytes(self, size):
+        with self._bytes_lock:
+            self.bytes_downloaded += size
+
     def _extract_av_bv(self, video_url):
         """
         从输入字符串中提取AV号或BV号
@@ -122,131 +135,6 @@ class BilibiliDownloader:
             else:
                 raise ValueError("无法从输入中提取有效的AV号或BV号")
 
-    def save_config(self):
-        """
-        保存配置到文件
-        """
-        save_config(self.config)
-
-    def _verify_ffmpeg(self):
-        """
-        验证FFmpeg是否可用
-        """
-        try:
-            exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
-            ffmpeg_exe = os.path.join(self.ffmpeg_path, exe_name) if self.ffmpeg_path else exe_name
-
-            if not which(ffmpeg_exe) and not os.path.exists(ffmpeg_exe):
-                raise Exception(f"FFmpeg文件不存在: {ffmpeg_exe}")
-
-            result = subprocess.run(
-                [ffmpeg_exe, "-version"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg运行失败: {result.stderr}")
-
-            print(f"已找到FFmpeg: {ffmpeg_exe}")
-            return True
-
-        except Exception as e:
-            print(f"FFmpeg验证失败: {e}")
-            print("请检查FFmpeg路径是否正确，或重新安装FFmpeg")
-            self._auto_config_ffmpeg()
-            return False
-
-    def _auto_config_ffmpeg(self):
-        """
-        自动配置FFmpeg路径
-        """
-        system_ffmpeg = which('ffmpeg') or which('ffmpeg.exe')
-        if system_ffmpeg and os.path.exists(system_ffmpeg):
-            ffmpeg_bin_dir = os.path.dirname(system_ffmpeg)
-            print(f"自动找到了FFmpeg bin目录: {ffmpeg_bin_dir}")
-            self.ffmpeg_path = ffmpeg_bin_dir
-            self.config['ffmpeg']['path'] = ffmpeg_bin_dir
-            self.save_config()
-        else:
-            print("未找到FFmpeg的bin目录，请手动配置")
-            while True:
-                user_input = input("请手动输入FFmpeg的bin目录完整路径: ").strip()
-                exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
-                if user_input and os.path.exists(os.path.join(user_input, exe_name)):
-                    self.ffmpeg_path = user_input
-                    print(f"已使用手动输入的FFmpeg bin目录: {self.ffmpeg_path}")
-                    self.config['ffmpeg']['path'] = user_input
-                    self.save_config()
-                    break
-                else:
-                    print("输入的目录无效或不包含FFmpeg可执行文件，请重新输入")
-
-    def load_cookies(self, cookie_path=None):
-        """
-        加载Cookie，以sessdata为主
-
-        Args:
-            cookie_path (str, optional): Cookie文件路径
-        """
-        # 从配置文件加载sessdata
-        self.sessdata = self.config.get('sessdata', '').strip()
-
-        # 设置会话Cookie
-        if self.sessdata:
-            self.session.cookies.set('SESSDATA', self.sessdata)
-            print("已从配置文件加载SESSDATA")
-
-        # 检查登录状态
-        self._check_login_status()
-
-        # 如果未登录，提示用户输入
-        if not self.logged_in:
-            print("未检测到有效登录状态，更高画质可能无法下载")
-            use_login = input("是否要使用登录状态下载？(y/n): ").strip().lower()
-            if use_login == 'y':
-                print("请在浏览器中登录B站后，获取SESSDATA")
-                print("获取方法：F12打开开发者工具 -> Application -> Cookies -> .bilibili.com -> SESSDATA")
-                self.sessdata = input("请输入SESSDATA值: ").strip()
-                if self.sessdata:
-                    self.session.cookies.set('SESSDATA', self.sessdata)
-                    # 验证登录状态
-                    if self._check_login_status():
-                        # 保存到配置文件
-                        save_sess = input("是否保存SESSDATA到配置文件？(y/n): ").strip().lower()
-                        if save_sess == 'y':
-                            self.config['sessdata'] = self.sessdata
-                            self.save_config()
-                            print("SESSDATA已保存到配置文件")
-                else:
-                    print("未输入有效的SESSDATA，将使用未登录状态")
-
-    def _check_login_status(self):
-        """
-        检查登录状态
-
-        Returns:
-            bool: 是否已登录
-        """
-        try:
-            url = "https://api.bilibili.com/x/web-interface/nav"
-            response = self.session.get(url, timeout=10)
-            data = response.json()
-
-            if data["code"] == 0 and data["data"]["isLogin"]:
-                self.logged_in = True
-                print(f"登录状态有效，当前用户: {data['data']['uname']}")
-                return True
-            else:
-                print("SESSDATA已过期或无效")
-                self.logged_in = False
-                return False
-        except Exception as e:
-            print(f"检查登录状态失败: {e}")
-            self.logged_in = False
-            return False
-
     def get_video_info(self):
         """
         获取视频信息
@@ -299,6 +187,7 @@ class BilibiliDownloader:
         if up_info_match:
             try:
                 initial_state = json.loads(up_info_match.group(1))
+                self.initial_state = initial_state
                 if 'upData' in initial_state:
                     up_name = initial_state['upData'].get('name', up_name)
                     up_id = initial_state['upData'].get('mid', up_id)
@@ -338,55 +227,58 @@ class BilibiliDownloader:
 
         return title, cid, up_name, up_id
 
+    def _playurl_params(self, cid, qn):
+        """
+        构建playurl请求参数
+
+        Args:
+            cid (str): 视频CID
+            qn (int): 请求的画质代码
+
+        Returns:
+            dict: 请求参数
+        """
+        params = {
+            "cid": cid,
+            "qn": qn,
+            "otype": "json",
+            "fnval": 16,
+            "fourk": 1 if qn in [120, 126, 127] else 0,
+            "fnver": 0
+        }
+        if self.av_num.startswith('av'):
+            params["avid"] = self.av_num[2:]
+        else:
+            params["bvid"] = self.av_num
+        return params
+
+    def _preferred_qn(self):
+        """
+        优先级最高的画质代码
+        """
+        return max(self.quality_priority, key=lambda x: self.quality_priority[x])
+
     def get_best_quality(self, cid):
         """
         获取最佳可用画质
 
+        playurl对任意qn都返回成功，并在quality字段中给出实际提供的画质，
+        因此只需以最高优先级的画质请求一次
+
         Args:
             cid (str): 视频CID
 
         Returns:
             int: 最佳画质代码
         """
-        # 按优先级排序的qn值列表
-        quality_priority = sorted(
-            self.quality_priority.keys(),
-            key=lambda x: self.quality_priority[x],
-            reverse=True
-        )
-
-        # 检查每个质量是否可用
-        for qn in quality_priority:
-            try:
-                # 构建API请求
-                if self.av_num.startswith('av'):
-                    url = "https://api.bilibili.com/x/player/playurl"
-                    params = {
-                        "avid": self.av_num[2:],
-                        "cid": cid,
-                        "qn": qn,
-                        "otype": "json",
-                        "fnval": 16,
-                        "fourk": 1 if qn in [120, 126, 127] else 0
-                    }
-                else:
-                    url = "https://api.bilibili.com/x/player/playurl"
-                    params = {
-                        "bvid": self.av_num,
-                        "cid": cid,
-                        "qn": qn,
-                        "otype": "json",
-                        "fnval": 16,
-                        "fourk": 1 if qn in [120, 126, 127] else 0
-                    }
-
-                response = self.session.get(url, params=params, timeout=10)
-                data = response.json()
-
-                if data["code"] == 0:
-                    return qn
-            except:
-                continue
+        try:
+            response = self._api_get("https://api.bilibili.com/x/player/playurl",
+                                     params=self._playurl_params(cid, self._preferred_qn()), timeout=10)
+            data = response.json()
+            if data["code"] == 0:
+                return data["data"]["quality"]
+        except Exception:
+            pass
 
         # 默认返回1080P
         return 80
@@ -395,42 +287,20 @@ class BilibiliDownloader:
         """
         获取下载链接
 
+        以最高优先级的画质请求playurl，文件名和结果中的画质以响应的quality字段为准
+
         Args:
             cid (str): 视频CID
 
         Returns:
             dict: 下载信息字典
         """
-        # 获取最佳可用质量
-        best_qn = self.get_best_quality(cid)
-        print(f"已选择最高可用清晰度: {self.quality_map.get(best_qn, f'未知({best_qn})')}")
-
-        # 构建请求参数
-        if self.av_num.startswith('av'):
-            url = "https://api.bilibili.com/x/player/playurl"
-            params = {
-                "avid": self.av_num[2:],
-                "cid": cid,
-                "qn": best_qn,
-                "otype": "json",
-                "fnval": 16,
-                "fourk": 1 if best_qn in [120, 126, 127] else 0,
-                "fnver": 0
-            }
-        else:
-            url = "https://api.bilibili.com/x/player/playurl"
-            params = {
-                "bvid": self.av_num,
-                "cid": cid,
-                "qn": best_qn,
-                "otype": "json",
-                "fnval": 16,
-                "fourk": 1 if best_qn in [120, 126, 127] else 0,
-                "fnver": 0
-            }
+        url = "https://api.bilibili.com/x/player/playurl"
+        requested_qn = self._preferred_qn()
+        params = self._playurl_params(cid, requested_qn)
 
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            response = self._api_get(url, params=params, timeout=10)
             data = response.json()
 
             if data["code"] != 0:
@@ -443,20 +313,25 @@ class BilibiliDownloader:
                     error_msg += "\n权限不足，可能需要会员才能下载此清晰度"
                 raise Exception(error_msg)
 
+            quality = data["data"].get("quality", requested_qn)
+            quality_description = self.quality_map.get(quality, f'未知({quality})')
+            self._log(f"已选择最高可用清晰度: {quality_description}")
+
             if "dash" in data["data"]:
                 return {
                     "type": "dash",
                     "video": data["data"]["dash"]["video"],
                     "audio": data["data"]["dash"]["audio"],
-                    "quality": best_qn,
-                    "quality_description": self.quality_map.get(best_qn, f'未知({best_qn})')
+                    "duration": data["data"]["dash"].get("duration"),
+                    "quality": quality,
+                    "quality_description": quality_description
                 }
             elif "durl" in data["data"]:
                 return {
                     "type": "flv",
                     "durl": data["data"]["durl"],
-                    "quality": best_qn,
-                    "quality_description": self.quality_map.get(best_qn, f'未知({best_qn})'),
+                    "quality": quality,
+                    "quality_description": quality_description,
                     "format_name": data["data"]["format"]
                 }
             else:
@@ -491,26 +366,36 @@ class BilibiliDownloader:
                         return q_id
         return None
 
-    def download_with_progress(self, url, filename, total_size=None, is_encrypted=False, key=None):
+    def download_with_progress(self, url, filename, total_size=None, is_encrypted=False, key=None, dedup=True):
         """
         带进度条的下载函数
 
+        启用内容查重时，写入过程中同步计算内容指纹并记录到self.content_keys；
+        头部数据与已有文件相同时，只额外请求文件尾部确认，确认重复后立即停止下载，
+        并将已有文件路径记录到self.dedup_hits，此时不会生成filename
+
         Args:
             url (str): 下载链接
             filename (str): 保存文件名
             total_size (int, optional): 文件总大小
             is_encrypted (bool): 是否加密
             key (bytes): 解密密钥
+            dedup (bool): 是否允许提前查重
 
         Returns:
             bool: 是否下载成功
         """
         temp_path = filename + ".part"
         start_pos = 0
+        downloaded = 0
+        progress_started = False
+        self.dedup_hits.pop(filename, None)
 
         # 检查是否已存在完整文件
         if os.path.exists(filename):
-            print(f"文件已存在: {os.path.basename(filename)}，跳过下载")
+            self._log(f"文件已存在: {os.path.basename(filename)}，跳过下载")
+            if self.dedup_store:
+                self.content_keys[filename] = ContentHasher.of_file(filename, self.dedup_sample_bytes)
             return True
 
         # 检查是否有临时文件
@@ -518,6 +403,8 @@ class BilibiliDownloader:
             start_pos = os.path.getsize(temp_path)
             if total_size and start_pos >= total_size:
                 os.rename(temp_path, filename)
+                if self.dedup_store:
+                    self.content_keys[filename] = ContentHasher.of_file(filename, self.dedup_sample_bytes)
                 return True
 
         headers = {
@@ -531,18 +418,21 @@ class BilibiliDownloader:
                 response.raise_for_status()
 
                 if not total_size:
-                    total_size = int(response.headers.get("Content-Length", 0))
-                total_size += start_pos
+                    total_size = int(response.headers.get("Content-Length", 0)) + start_pos
+
+                hasher = None
+                check_duplicate = False
+                if self.dedup_store and not is_encrypted:
+                    hasher = ContentHasher(self.dedup_sample_bytes, total_size)
+                    if start_pos > 0:
+                        hasher.update_from_file(temp_path, start_pos)
+                    check_duplicate = dedup
 
                 mode = 'ab' if start_pos > 0 else 'wb'
-                with open(temp_path, mode) as f, tqdm(
-                        total=total_size,
-                        initial=start_pos,
-                        unit="B",
-                        unit_scale=True,
-                        unit_divisor=1024,
-                        desc=os.path.basename(filename)
-                ) as pbar:
+                downloaded = start_pos
+                self.events.progress_start(filename, os.path.basename(filename), total_size, start_pos)
+                progress_started = True
+                with open(temp_path, mode) as f:
 
                     if is_encrypted and key:
                         cipher = AES.new(key, AES.MODE_CBC, iv=key)
@@ -550,22 +440,89 @@ class BilibiliDownloader:
                             if chunk:
                                 decrypted_chunk = cipher.decrypt(chunk)
                                 f.write(decrypted_chunk)
-                                pbar.update(len(chunk))
+                                downloaded += len(chunk)
+                                self.events.progress(filename, downloaded, total_size)
                     else:
                         for chunk in response.iter_content(chunk_size=1024 * 16):
                             if chunk:
                                 f.write(chunk)
-                                pbar.update(len(chunk))
+                                downloaded += len(chunk)
+                                self.events.progress(filename, downloaded, total_size)
+                                if hasher:
+                                    hasher.update(chunk)
+                                    if check_duplicate and hasher.head_ready():
+                                        check_duplicate = False
+                                        existing_path = self._find_duplicate(url, hasher)
+                                        if existing_path:
+                                            self.dedup_hits[filename] = existing_path
+                                            break
+
+            self.events.progress_end(filename, downloaded, total_size)
+            self._add_downloaded_bytes(downloaded - start_pos)
+
+            if filename in self.dedup_hits:
+                os.remove(temp_path)
+                self._log(f"发现重复内容: {os.path.basename(filename)} 与 {self.dedup_hits[filename]} 相同，停止下载")
+                return True
 
             os.rename(temp_path, filename)
+            if hasher:
+                self.content_keys[filename] = hasher.finish(filename)
             return True
 
         except Exception as e:
-            print(f"下载失败: {str(e)}")
+            if progress_started:
+                self.events.progress_end(filename, downloaded, total_size, success=False)
+                self._add_downloaded_bytes(downloaded - start_pos)
+            self._log(f"下载失败: {str(e)}", level="error")
             if os.path.exists(temp_path) and os.path.getsize(temp_path) < 1024:
                 os.remove(temp_path)
             return False
 
+    def _find_duplicate(self, url, hasher):
+        """
+        头部数据与已有文件相同时，请求文件尾部确认是否为重复内容
+
+        Args:
+            url (str): 下载链接
+            hasher (ContentHasher): 已完成头部采样的指纹计算器
+
+        Returns:
+            str or None: 重复的已有文件路径
+        """
+        if not self.dedup_store.has_candidates(hasher.total_size, hasher.head_digest(), exclude=self.output_path):
+            return None
+
+        # 小于采样大小的流在头部采样完成时已经全部下载，直接用已有数据计算指纹
+        if hasher.complete():
+            return self.dedup_store.lookup(hasher.key(), exclude=self.output_path)
+
+        tail_start = max(0, hasher.total_size - hasher.sample_bytes)
+        headers = {
+            "Range": f"bytes={tail_start}-{hasher.total_size - 1}",
+            "Referer": "https://www.bilibili.com/",
+            "Origin": "https://www.bilibili.com"
+        }
+        try:
+            response = self.session.get(url, headers=headers, timeout=10)
+            response.raise_for_status()
+            if response.status_code != 206:
+                return None
+            return self.dedup_store.lookup(hasher.key_with_tail(response.content), exclude=self.output_path)
+        except Exception as e:
+            self._log(f"查重请求失败，继续下载: {e}", level="warning")
+            return None
+
+    def _link_duplicate(self, existing_path, output_path):
+        """
+        将重复内容的已有文件链接到输出路径
+        """
+        method = ContentStore.link(existing_path, output_path)
+        if method is None:
+            self._log(f"已有文件即为输出文件，无需复用: {output_path}")
+            return
+        self._log(f"已通过{method}复用已有文件: {existing_path} -> {output_path}")
+
     def merge_video_audio(self, video_path, audio_path, output_path):
         """
         合并视频和音频
@@ -578,13 +535,8 @@ class BilibiliDownloader:
         Returns:
             bool: 是否合并成功
         """
-        if not self.ffmpeg_path:
-            print("未配置有效的FFmpeg，无法合并视频音频")
-            return False
-
         try:
-            exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
-            ffmpeg_exe = os.path.join(self.ffmpeg_path, exe_name)
+            ffmpeg_exe = self._ffmpeg_exe()
 
             if os.path.exists(output_path):
                 os.remove(output_path)
@@ -618,115 +570,531 @@ class BilibiliDownloader:
             return True
 
         except Exception as e:
-            print(f"合并音视频失败: {str(e)}")
+            self._log(f"合并音视频失败: {str(e)}", level="error")
             return False
 
+    def concat_segments(self, segment_paths, output_path):
+        """
+        按顺序无损拼接多个视频分段并封装为输出文件的格式（只有一个分段时仅重新封装）
+
+        Args:
+            segment_paths (list): 分段文件路径列表
+            output_path (str): 输出文件路径
+
+        Returns:
+            bool: 是否拼接成功
+        """
+        list_path = output_path + ".concat.txt"
+        try:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for path in segment_paths:
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+
+            cmd = [
+                self._ffmpeg_exe(),
+                "-f", "concat",
+                "-safe", "0",
+                "-i", list_path,
+                "-c", "copy",
+                "-loglevel", "error",
+                output_path
+            ]
+
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+
+            if result.returncode != 0:
+                raise Exception(f"FFmpeg错误输出: {result.stderr}")
+
+            # 清理临时文件
+            for path in segment_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+            return True
+
+        except Exception as e:
+            self._log(f"拼接视频分段失败: {str(e)}", level="error")
+            return False
+
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+
+    def validate_output(self, output_path):
+        """
+        使用FFprobe校验输出文件是否包含有效的音视频流
+
+        Args:
+            output_path (str): 输出文件路径
+
+        Returns:
+            bool: 是否校验通过
+        """
+        try:
+            cmd = [
+                self._ffprobe_exe(),
+                "-v", "error",
+                "-show_entries", "stream=codec_type:format=duration",
+                "-of", "json",
+                output_path
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise Exception(f"FFprobe错误输出: {result.stderr}")
+
+            probe = json.loads(result.stdout)
+            codec_types = {stream.get("codec_type") for stream in probe.get("streams", [])}
+            duration = float(probe.get("format", {}).get("duration", 0) or 0)
+            if "video" not in codec_types or duration <= 0:
+                raise Exception(f"缺少视频流或时长无效（流: {sorted(codec_types)}, 时长: {duration}）")
+
+            self._log(f"文件校验通过: 时长 {duration:.1f}秒，包含 {', '.join(sorted(codec_types))} 流")
+            return True
+
+        except Exception as e:
+            self._log(f"文件校验失败: {str(e)}", level="error")
+            return False
+
+    def extract_thumbnail(self, video_path, thumbnail_path):
+        """
+        从视频中提取一帧代表性画面作为缩略图
+
+        Args:
+            video_path (str): 视频文件路径
+            thumbnail_path (str): 缩略图保存路径
+
+        Returns:
+            bool: 是否提取成功
+        """
+        try:
+            cmd = [
+                self._ffmpeg_exe(),
+                "-y",
+                "-i", video_path,
+                "-vf", "thumbnail",
+                "-frames:v", "1",
+                "-loglevel", "error",
+                thumbnail_path
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise Exception(f"FFmpeg错误输出: {result.stderr}")
+            return True
+
+        except Exception as e:
+            self._log(f"提取缩略图失败: {str(e)}", level="error")
+            return False
+
+    def prepare(self):
+        """
+        准备下载任务：获取视频信息和下载链接，确定保存路径并处理覆盖逻辑
+
+        Returns:
+            dict or None: 下载任务信息，无需下载或失败时返回None，原因记录在self.status
+        """
+        started = time.monotonic()
+        self.status = "failed"
+
+        # 获取视频信息
+        title, cid, up_name, up_id = self.get_video_info()
+        if not cid:
+            self._log("无法获取视频CID，下载失败", level="error")
+            return None
+
+        safe_title = re.sub(r'[\/:*?"<>|]', '', title)
+        self._log(f"视频标题: {safe_title}, CID: {cid}, UP主: {up_name}({up_id})")
+
+        # 检查是否需要登录
+        if not self.logged_in and not self.account_pool:
+            self._log("\n注意: 该视频可能需要登录才能下载高清版本")
+            if self._ask("是否现在输入SESSDATA? (y/n): ", "n").lower() == 'y':
+                self.load_cookies()
+                if not self.logged_in:
+                    self._log("登录失败，将尝试使用未登录状态继续", level="warning")
+
+        # 获取下载链接
+        download_info = self.get_download_url(cid)
+        if not download_info:
+            self._log("无法获取下载链接，下载失败", level="error")
+            return None
+
+        # 获取到CDN地址后立即在后台预热连接，与后续的准备工作并行
+        if download_info["type"] == "dash":
+            stream_urls = [stream["baseUrl"] for stream in download_info["video"] + download_info["audio"]]
+        else:
+            stream_urls = [durl["url"] for durl in download_info["durl"]]
+        self.transport.prewarm(stream_urls)
+
+        # 构建下载路径：基础目录/UP主名称_UP主ID/
+        safe_up_name = re.sub(r'[\/:*?"<>|]', '_', up_name)
+        self.video_dir = os.path.join(self.base_download_dir, f"{safe_up_name}_{up_id}")
+        os.makedirs(self.video_dir, exist_ok=True)
+        self._log(f"视频将保存到: {self.video_dir}")
+
+        # 构建文件名：标题_清晰度_AV/BV号.mp4
+        quality_desc = download_info['quality_description'].split()[0]
+        output_filename = f"{safe_title}_{quality_desc}_{self.av_num}.mp4"
+        output_path = os.path.join(self.video_dir, output_filename)
+        self.output_path = output_path
+
+        # 检查现有文件
+        existing_quality = self.get_existing_quality(self.video_dir, title, self.av_num)
+
+        # 处理覆盖逻辑
+        if existing_quality is not None:
+            current_priority = self.quality_priority.get(download_info['quality'], 0)
+            existing_priority = self.quality_priority.get(existing_quality, 0)
+
+            if not self.overwrite_existing and not self.higher_quality_replace:
+                self._log(f"视频已存在: {output_filename}，跳过下载")
+                self.status = "skipped"
+                return None
+            elif self.higher_quality_replace and current_priority <= existing_priority:
+                self._log(f"已存在相同或更高质量的视频，跳过下载")
+                self.status = "skipped"
+                return None
+            elif self.overwrite_existing or (self.higher_quality_replace and current_priority > existing_priority):
+                self._log(f"将替换现有视频文件，质量: {quality_desc}")
+
+        # 字幕、弹幕和封面与主视频流并行下载
+        side_fetcher = SideArtifactFetcher(self.session, self.av_num, cid, self.initial_state,
+                                           self.html_tree, self.side_artifacts, self._log)
+        side_fetcher.start(self.video_dir, f"{safe_title}_{self.av_num}")
+
+        return {
+            "title": title,
+            "safe_title": safe_title,
+            "cid": cid,
+            "download_info": download_info,
+            "output_path": output_path,
+            "side_fetcher": side_fetcher,
+            "reservation": None,
+            "parts": [],
+            "merge": None,
+            "content_keys": [],
+            "side_artifacts": {},
+            "post_process": {},
+            "timings": {"prepare": round(time.monotonic() - started, 3)}
+        }
+
+    def fetch_streams(self, job):
+        """
+        下载阶段：申请磁盘空间并下载视频流
+
+        下载完成后job["merge"]为需要执行的合并方式（dash/concat），为None时视频已经完成
+
+        Args:
+            job (dict): prepare返回的下载任务
+
+        Returns:
+            bool: 是否需要继续后续阶段
+        """
+        download_info = job["download_info"]
+        safe_title = job["safe_title"]
+        output_path = job["output_path"]
+        temp_dir = self.temp_dir or self.video_dir
+
+        # 处理DASH格式（音视频分离）
+        if download_info["type"] == "dash":
+            self._log("检测到DASH格式视频（音视频分离）")
+
+            # 选择最高质量的视频和音频流
+            video_stream = max(download_info["video"],
+                               key=lambda x: (x.get("width", 0), x.get("height", 0), x.get("bandwidth", 0)))
+            audio_stream = max(download_info["audio"],
+                               key=lambda x: x.get("bandwidth", 0))
+
+            self._log(f"选中视频流: {video_stream['width']}x{video_stream['height']}")
+            self._log(f"选中音频流: {audio_stream['bandwidth']}bps")
+
+            # 临时文件路径
+            job["parts"] = [
+                (video_stream["baseUrl"], os.path.join(temp_dir, f"{safe_title}_video_{self.av_num}.m4s"),
+                 video_stream.get("size")),
+                (audio_stream["baseUrl"], os.path.join(temp_dir, f"{safe_title}_audio_{self.av_num}.m4s"),
+                 audio_stream.get("size"))
+            ]
+
+            # 合并时临时流文件和成品同时存在，需要约两倍的空间，合并完成后释放
+            stream_size = (StorageManager.estimate_stream_size(video_stream, download_info.get("duration")) +
+                           StorageManager.estimate_stream_size(audio_stream, download_info.get("duration")))
+            job["reservation"] = self.storage.acquire([(temp_dir, stream_size), (self.video_dir, stream_size)])
+
+            # 依次下载视频流和音频流
+            self._log("开始下载视频流和音频流...")
+            job["merge"] = "dash"
+
+        # 处理FLV格式（音视频合并）
+        elif download_info["type"] == "flv":
+            self._log("检测到FLV格式视频（音视频合并）")
+            durls = sorted(download_info["durl"], key=lambda x: x.get("order", 0))
+
+            # 检查文件是否已存在
+            if os.path.exists(output_path):
+                self._log(f"视频文件已存在: {output_path}，跳过下载")
+                self.status = "skipped"
+                return False
+
+            # durl中的length为分段时长（毫秒），size才是分段字节数
+            total_size = sum(durl.get("size", 0) for durl in durls)
+
+            # 并发下载所有分段后按顺序无损拼接，只有一个分段时同样经过FFmpeg将FLV封装为MP4
+            job["parts"] = [
+                (durl["url"], os.path.join(temp_dir, f"{safe_title}_part{index:03d}_{self.av_num}.flv"), durl.get("size"))
+                for index, durl in enumerate(durls, start=1)
+            ]
+            job["reservation"] = self.storage.acquire([(temp_dir, total_size), (self.video_dir, total_size)])
+            if len(job["parts"]) > 1:
+                self._log(f"视频共 {len(job['parts'])} 个分段，开始并发下载...")
+            else:
+                self._log("开始下载视频...")
+            job["merge"] = "concat"
+
+        else:
+            return False
+
+        # 登记任务写入的文件，其他任务检查空间时只扣除尚未写入的预留
+        for path in [path for _, path, _ in job["parts"]] + [output_path]:
+            job["reservation"].track(path)
+
+        success, existing_path = self._download_parts(
+            job["parts"], self.flv_segment_workers if job["merge"] == "concat" else 1)
+        if not success:
+            return False
+
+        # 所有流都与同一个已有文件重复时直接复用
+        if existing_path:
+            self._link_duplicate(existing_path, output_path)
+            job["merge"] = None
+            return True
+
+        # 合并前记录指纹，合并成功后临时流文件会被删除
+        job["content_keys"] = [self.content_keys.get(path) for _, path, _ in job["parts"]]
+        return True
+
+    def merge_streams(self, job):
+        """
+        合并阶段：合并音视频或拼接分段，完成后释放临时文件占用的磁盘空间
+
+        Args:
+            job (dict): 已完成下载阶段的下载任务
+
+        Returns:
+            bool: 是否需要继续后续阶段
+        """
+        output_path = job["output_path"]
+        paths = [path for _, path, _ in job["parts"]]
+
+        if job["merge"] == "dash":
+            self._log("开始合并音视频...")
+            success = self.merge_video_audio(paths[0], paths[1], output_path)
+        elif job["merge"] == "concat":
+            self._log("开始拼接视频分段..." if len(paths) > 1 else "开始将FLV封装为MP4...")
+            success = self.concat_segments(paths, output_path)
+        else:
+            success = True
+
+        if job["merge"] and success:
+            self._log(f"下载完成: {output_path}")
+            self._record_content(job["content_keys"], output_path)
+        # 视频已完整生成，后处理的结果单独记录在job["post_process"]中
+        if success:
+            self.status = "completed"
+
+        if job["reservation"]:
+            job["reservation"].release()
+        return success
+
+    def post_process(self, job):
+        """
+        后处理阶段：按配置提取缩略图、校验输出文件，并等待附属资源下载完成
+
+        各步骤是否成功记录在job["post_process"]中，不影响下载状态
+
+        Args:
+            job (dict): 已完成合并阶段的下载任务
+
+        Returns:
+            bool: 后处理是否全部成功
+        """
+        output_path = job["output_path"]
+        steps = job["post_process"]
+
+        if self.post_options.get('validate'):
+            steps["validate"] = self.validate_output(output_path)
+        if self.post_options.get('thumbnail'):
+            thumbnail_path = os.path.splitext(output_path)[0] + ".jpg"
+            steps["thumbnail"] = self.extract_thumbnail(output_path, thumbnail_path)
+            if steps["thumbnail"]:
+                self._log(f"缩略图已保存: {thumbnail_path}")
+
+        job["side_artifacts"] = job["side_fetcher"].wait()
+        return all(steps.values())
+
+    def finish(self, job):
+        """
+        结束下载任务，释放磁盘空间预留并等待附属资源下载完成，可重复调用
+
+        Args:
+            job (dict): 下载任务
+        """
+        if job["reservation"]:
+            job["reservation"].release()
+        side_artifacts = job["side_fetcher"].wait()
+        if side_artifacts:
+            job["side_artifacts"] = side_artifacts
+
+    def run_stage(self, job, stage):
+        """
+        执行一个下载阶段并记录耗时
+
+        Args:
+            job (dict): 下载任务
+            stage (str): 阶段名称：download、merge、post_process
+
+        Returns:
+            bool: 是否需要继续后续阶段
+        """
+        handlers = {
+            "download": self.fetch_streams,
+            "merge": self.merge_streams,
+            "post_process": self.post_process
+        }
+        started = time.monotonic()
+        try:
+            return handlers[stage](job)
+        finally:
+            job["timings"][stage] = round(time.monotonic() - started, 3)
+
+    def build_result(self, job=None, error=None):
+        """
+        生成结构化的下载结果
+
+        Args:
+            job (dict, optional): 下载任务，准备阶段失败或跳过时为None
+            error (str, optional): 错误信息
+
+        Returns:
+            dict: 包含status（completed/skipped/failed，只反映下载和合并的结果）、output_path、quality、
+                  bytes_downloaded、timings（各阶段耗时，秒）、side_artifacts、
+                  post_process（已启用的后处理步骤 -> 是否成功）和error
+        """
+        result = {
+            "status": self.status or "failed",
+            "av_num": self.av_num,
+            "title": None,
+            "output_path": None,
+            "quality": None,
+            "quality_description": None,
+            "bytes_downloaded": self.bytes_downloaded,
+            "timings": {},
+            "side_artifacts": {},
+            "post_process": {},
+            "error": error
+        }
+        if job:
+            result.update({
+                "title": job["title"],
+                "output_path": job["output_path"] if os.path.exists(job["output_path"]) else None,
+                "quality": job["download_info"]["quality"],
+                "quality_description": job["download_info"]["quality_description"],
+                "timings": dict(job["timings"]),
+                "side_artifacts": job["side_artifacts"],
+                "post_process": dict(job["post_process"])
+            })
+        return result
+
     def run(self):
         """
         执行下载流程
+
+        Returns:
+            dict: 下载结果，格式见build_result
         """
+        job = None
+        error = None
         try:
-            # 获取视频信息
-            title, cid, up_name, up_id = self.get_video_info()
-            if not cid:
-                print("无法获取视频CID，下载失败")
-                return
-
-            safe_title = re.sub(r'[\/:*?"<>|]', '', title)
-            print(f"视频标题: {safe_title}, CID: {cid}, UP主: {up_name}({up_id})")
-
-            # 检查是否需要登录
-            if not self.logged_in:
-                print("\n注意: 该视频可能需要登录才能下载高清版本")
-                if input("是否现在输入SESSDATA? (y/n): ").lower() == 'y':
-                    self.load_cookies()
-                    if not self.logged_in:
-                        print("登录失败，将尝试使用未登录状态继续")
-
-            # 获取下载链接
-            download_info = self.get_download_url(cid)
-            if not download_info:
-                print("无法获取下载链接，下载失败")
-                return
-
-            # 构建下载路径：基础目录/UP主名称_UP主ID/
-            safe_up_name = re.sub(r'[\/:*?"<>|]', '_', up_name)
-            self.video_dir = os.path.join(self.base_download_dir, f"{safe_up_name}_{up_id}")
-            os.makedirs(self.video_dir, exist_ok=True)
-            print(f"视频将保存到: {self.video_dir}")
-
-            # 构建文件名：标题_清晰度_AV/BV号.mp4
-            quality_desc = download_info['quality_description'].split()[0]
-            output_filename = f"{safe_title}_{quality_desc}_{self.av_num}.mp4"
-            output_path = os.path.join(self.video_dir, output_filename)
-
-            # 检查现有文件
-            existing_quality = self.get_existing_quality(self.video_dir, title, self.av_num)
-
-            # 处理覆盖逻辑
-            if existing_quality is not None:
-                current_priority = self.quality_priority.get(download_info['quality'], 0)
-                existing_priority = self.quality_priority.get(existing_quality, 0)
-
-                if not self.overwrite_existing and not self.higher_quality_replace:
-                    print(f"视频已存在: {output_filename}，跳过下载")
-                    return
-                elif self.higher_quality_replace and current_priority <= existing_priority:
-                    print(f"已存在相同或更高质量的视频，跳过下载")
-                    return
-                elif self.overwrite_existing or (self.higher_quality_replace and current_priority > existing_priority):
-                    print(f"将替换现有视频文件，质量: {quality_desc}")
-
-            # 处理DASH格式（音视频分离）
-            if download_info["type"] == "dash":
-                print("检测到DASH格式视频（音视频分离）")
-
-                # 选择最高质量的视频和音频流
-                video_stream = max(download_info["video"],
-                                   key=lambda x: (x.get("width", 0), x.get("height", 0), x.get("bandwidth", 0)))
-                audio_stream = max(download_info["audio"],
-                                   key=lambda x: x.get("bandwidth", 0))
-
-                print(f"选中视频流: {video_stream['width']}x{video_stream['height']}")
-                print(f"选中音频流: {audio_stream['bandwidth']}bps")
-
-                # 临时文件路径
-                video_path = os.path.join(self.video_dir, f"{safe_title}_video_{self.av_num}.m4s")
-                audio_path = os.path.join(self.video_dir, f"{safe_title}_audio_{self.av_num}.m4s")
-
-                # 下载视频流
-                print("开始下载视频流...")
-                if not self.download_file(video_stream["baseUrl"], video_path, video_stream.get("size")):
-                    return
-
-                # 下载音频流
-                print("开始下载音频流...")
-                if not self.download_file(audio_stream["baseUrl"], audio_path, audio_stream.get("size")):
-                    return
-
-                # 合并音视频
-                print("开始合并音视频...")
-                if self.merge_video_audio(video_path, audio_path, output_path):
-                    print(f"下载完成: {output_path}")
-
-            # 处理FLV格式（音视频合并）
-            elif download_info["type"] == "flv":
-                print("检测到FLV格式视频（音视频合并）")
-                durl = download_info["durl"][0]
-
-                # 检查文件是否已存在
-                if os.path.exists(output_path):
-                    print(f"视频文件已存在: {output_path}，跳过下载")
-                    return
-
-                print("开始下载视频...")
-                if self.download_file(durl["url"], output_path, durl["length"]):
-                    print(f"下载完成: {output_path}")
+            job = self.prepare()
+            if job:
+                try:
+                    if self.run_stage(job, "download") and self.run_stage(job, "merge"):
+                        # 后处理出错时视频已经完整生成，保留下载状态
+                        try:
+                            self.run_stage(job, "post_process")
+                        except Exception as e:
+                            error = f"post_process阶段出错: {e}"
+                            self._log(error, level="error")
+                finally:
+                    self.finish(job)
 
         except Exception as e:
-            print(f"操作失败: {e}")
+            self.status = "failed"
+            error = str(e)
+            self._log(f"操作失败: {e}", level="error")
+
+        result = self.build_result(job, error)
+        self.events.emit("result", result=result)
+        return result
+
+    def _download_parts(self, parts, max_workers=1):
+        """
+        下载多个流文件，max_workers大于1时并发下载
+
+        Args:
+            parts (list): [(下载链接, 保存路径, 文件大小), ...]
+            max_workers (int): 最大并发下载数
+
+        Returns:
+            tuple: (是否全部下载成功, 所有流都与同一个已有文件重复时为该文件路径，否则为None)
+        """
+        if max_workers > 1 and len(parts) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(parts))) as executor:
+                results = list(executor.map(lambda part: self.download_file(*part), parts))
+        else:
+            results = []
+            for part in parts:
+                results.append(self.download_file(*part))
+                if not results[-1]:
+                    break
+
+        if len(results) < len(parts) or not all(results):
+            self._log("部分文件下载失败，已下载的部分将在下次运行时续传", level="error")
+            return False, None
+
+        hits = [self.dedup_hits.get(path) for _, path, _ in parts]
+        if hits[0] and all(hit == hits[0] for hit in hits):
+            return True, hits[0]
+
+        # 只有部分流重复时无法复用，完整下载这些流
+        for (url, path, size), hit in zip(parts, hits):
+            if hit and not self.download_file(url, path, size, dedup=False):
+                return False, None
+        return True, None
+
+    def _record_content(self, keys, output_path):
+        """
+        将下载流的内容指纹记录到查重索引
+
+        Args:
+            keys (list): 内容指纹列表
+            output_path (str): 最终输出文件路径
+        """
+        if not self.dedup_store:
+            return
+        for content_key in keys:
+            if content_key:
+                self.dedup_store.add(content_key, output_path)
 
-    def download_file(self, url, save_path, total_size=None):
+    def download_file(self, url, save_path, total_size=None, dedup=True):
         """
         下载文件的包装方法
 
@@ -734,11 +1102,12 @@ class BilibiliDownloader:
             url (str): 下载链接
             save_path (str): 保存路径
             total_size (int, optional): 文件总大小
+            dedup (bool): 是否允许提前查重
 
         Returns:
             bool: 是否下载成功
         """
-        return self.download_with_progress(url, save_path, total_size)
+        return self.download_with_progress(url, save_path, total_size, dedup=dedup)
 
 
 if __name__ == "__main__":
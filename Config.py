@@ -25,19 +25,72 @@ DEFAULT_CONFIG = {
         'overwrite_existing': False,
         'higher_quality_replace': True
     },
-    'sessdata': ""
+    'sessdata': "",
+    'accounts': {
+        'sessdata_list': [],
+        'window_seconds': 60,
+        'max_requests': 30,
+        'park_seconds': 300,
+        'login_ttl': 1800
+    },
+    'flv_segment_workers': 4,
+    'side_artifacts': {
+        'subtitle': False,
+        'danmaku': False,
+        'cover': False
+    },
+    'storage': {
+        'temp_dir': '',
+        'reserve_mb': 512,
+        'wait_for_space': True,
+        'wait_timeout': 3600,
+        'poll_interval': 30
+    },
+    'dedup': {
+        'enabled': False,
+        'sample_mb': 4,
+        'index_path': ''
+    },
+    'post_process': {
+        'thumbnail': False,
+        'validate': False
+    },
+    'pipeline': {
+        'download_workers': 2,
+        'merge_workers': 1,
+        'post_workers': 1,
+        'queue_size': 2
+    },
+    'transport': {
+        'dns_cache_ttl': 300,
+        'prewarm': True,
+        'http2': False,
+        'pool_maxsize': 32
+    },
+    'live': {
+        'quality': 10000,
+        'segment_minutes': 60,
+        'segment_size_mb': 0,
+        'reconnect_delay': 5,
+        'max_reconnect': 0,
+        'wait_for_live': False,
+        'read_timeout': 30
+    }
 }
 
 
-def load_config():
+def load_config(log=print):
     """
     加载配置文件，如果不存在则创建默认配置
 
+    Args:
+        log (callable): 日志输出函数
+
     Returns:
         dict: 配置字典
     """
     if not os.path.exists(CONFIG_PATH):
-        print("配置文件config.yml不存在，将创建新文件并使用默认配置")
+        log("配置文件config.yml不存在，将创建新文件并使用默认配置")
         with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
             yaml.dump(DEFAULT_CONFIG, f, allow_unicode=True)
         return DEFAULT_CONFIG
@@ -51,13 +104,13 @@ def load_config():
             for key, value in DEFAULT_CONFIG.items():
                 if key not in config:
                     config[key] = value
-                    print(f"配置文件缺少'{key}'配置，已添加默认值")
+                    log(f"配置文件缺少'{key}'配置，已添加默认值")
                     config_updated = True
                 if isinstance(value, dict):
                     for sub_key, sub_value in value.items():
                         if sub_key not in config[key]:
                             config[key][sub_key] = sub_value
-                            print(f"配置文件缺少'{key}.{sub_key}'配置，已添加默认值")
+                            log(f"配置文件缺少'{key}.{sub_key}'配置，已添加默认值")
                             config_updated = True
 
             # 处理旧版本配置中可能存在的download_dir
@@ -65,28 +118,29 @@ def load_config():
                 config['base_download_dir'] = config['download_dir']
                 del config['download_dir']
                 config_updated = True
-                print("已更新下载目录配置为base_download_dir")
+                log("已更新下载目录配置为base_download_dir")
 
             if config_updated:
-                save_config(config)
-                print("配置文件已更新")
+                save_config(config, log)
+                log("配置文件已更新")
 
             return config
 
         except Exception as e:
-            print(f"读取配置文件失败: {e}，将使用默认配置")
+            log(f"读取配置文件失败: {e}，将使用默认配置")
             return DEFAULT_CONFIG
 
 
-def save_config(config):
+def save_config(config, log=print):
     """
     保存配置到文件
 
     Args:
         config (dict): 配置字典
+        log (callable): 日志输出函数
     """
     try:
         with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
             yaml.dump(config, f, allow_unicode=True)
     except Exception as e:
-        print(f"保存配置文件失败: {e}")
+        log(f"保存配置文件失败: {e}")
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+def same_file(path, other):
+    """
+    两个路径是否指向同一个文件（相同路径或硬链接/符号链接到同一文件）
+
+    Args:
+        path (str or None): 文件路径
+        other (str or None): 文件路径
+
+    Returns:
+        bool: 是否为同一个文件
+    """
+    if not path or not other:
+        return False
+    if os.path.abspath(path) == os.path.abspath(other):
+        return True
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+
+class ContentHasher:
+    """
+    内容指纹计算器
+    指纹由文件大小、前N字节和后N字节的哈希组成，在流式写入时同步计算，无需重新读取整个文件
+    """
+
+    def __init__(self, sample_bytes, total_size=None):
+        """
+        Args:
+            sample_bytes (int): 头部和尾部采样的字节数
+            total_size (int, optional): 文件总大小，已知时尾部哈希在写入过程中同步计算
+        """
+        self.sample_bytes = sample_bytes
+        self.total_size = total_size
+        self.position = 0
+        self._head = hashlib.sha1()
+        self._tail = hashlib.sha1()
+
+    def _tail_start(self):
+        return max(0, self.total_size - self.sample_bytes) if self.total_size else None
+
+    def update(self, chunk):
+        """
+        按写入顺序输入数据块
+
+        Args:
+            chunk (bytes): 写入文件的数据
+        """
+        start = self.position
+        end = start + len(chunk)
+        if start < self.sample_bytes:
+            self._head.update(chunk[:self.sample_bytes - start])
+        tail_start = self._tail_start()
+        if tail_start is not None and end > tail_start:
+            self._tail.update(chunk[max(0, tail_start - start):])
+        self.position = end
+
+    def update_from_file(self, path, length):
+        """
+        续传时从已下载的部分文件中读取采样区域，而不是读取整个文件
+
+        Args:
+            path (str): 部分文件路径
+            length (int): 部分文件大小
+        """
+        with open(path, 'rb') as f:
+            head_length = min(self.sample_bytes, length)
+            self._head.update(f.read(head_length))
+            tail_start = self._tail_start()
+            if tail_start is not None and length > tail_start:
+                f.seek(tail_start)
+                self._tail.update(f.read(length - tail_start))
+        self.position = length
+
+    def head_ready(self):
+        """
+        头部采样是否已完成（文件大小已知时才有意义）
+        """
+        return bool(self.total_size) and self.position >= min(self.sample_bytes, self.total_size)
+
+    def head_digest(self):
+        return self._head.hexdigest()
+
+    def key_with_tail(self, tail_data):
+        """
+        使用单独获取的尾部数据计算完整指纹，用于下载完成前的提前查重
+
+        Args:
+            tail_data (bytes): 文件最后N字节
+
+        Returns:
+            str: 内容指纹
+        """
+        return f"{self.total_size}-{self.head_digest()}-{hashlib.sha1(tail_data).hexdigest()}"
+
+    def complete(self):
+        """
+        是否已按顺序输入了全部数据（文件大小已知时才有意义）
+        """
+        return bool(self.total_size) and self.position >= self.total_size
+
+    def key(self):
+        """
+        已输入全部数据时直接得到内容指纹，无需读取文件或单独获取尾部数据
+
+        Returns:
+            str: 内容指纹
+        """
+        return f"{self.total_size}-{self.head_digest()}-{self._tail.hexdigest()}"
+
+    def finish(self, path):
+        """
+        文件写入完成后得到内容指纹
+
+        Args:
+            path (str): 完整文件路径
+
+        Returns:
+            str: 内容指纹
+        """
+        size = os.path.getsize(path)
+        if self.total_size == size and self.position == size:
+            tail_digest = self._tail.hexdigest()
+        else:
+            # 下载前未知文件大小，只读取文件尾部重新计算
+            with open(path, 'rb') as f:
+                f.seek(max(0, size - self.sample_bytes))
+                tail_digest = hashlib.sha1(f.read()).hexdigest()
+        return f"{size}-{self.head_digest()}-{tail_digest}"
+
+    @classmethod
+    def of_file(cls, path, sample_bytes):
+        """
+        计算已存在文件的内容指纹
+
+        Returns:
+            str: 内容指纹
+        """
+        size = os.path.getsize(path)
+        hasher = cls(sample_bytes, size)
+        hasher.update_from_file(path, size)
+        return hasher.finish(path)
+
+
+class ContentStore:
+    """
+    内容指纹索引
+    记录指纹到已下载文件的映射，用于发现不同BV号或UP主目录下的重复内容；
+    索引文件只追加记录，新增一个指纹不需要重写整个文件
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, index_path, log=print):
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.index = {}
+        # 大小和头部哈希 -> 具有该前缀的内容指纹集合，用于O(1)判断是否存在候选文件
+        self.by_prefix = {}
+        if os.path.exists(index_path):
+            try:
+                self._load()
+            except Exception as e:
+                log(f"读取内容索引失败: {e}，将重新建立索引")
+                self.index = {}
+                self.by_prefix = {}
+
+    @classmethod
+    def open(cls, index_path, log=print):
+        """
+        获取同一索引文件对应的共享实例，避免多个下载任务互相覆盖索引
+
+        Args:
+            index_path (str): 索引文件路径
+            log (callable): 日志输出函数
+
+        Returns:
+            ContentStore: 索引实例
+        """
+        index_path = os.path.abspath(index_path)
+        with cls._instances_lock:
+            if index_path not in cls._instances:
+                cls._instances[index_path] = cls(index_path, log)
+            return cls._instances[index_path]
+
+    @staticmethod
+    def _prefix(key):
+        return key.rsplit("-", 1)[0]
+
+    def _set(self, key, path):
+        if path is None:
+            self.index.pop(key, None)
+            keys = self.by_prefix.get(self._prefix(key))
+            if keys:
+                keys.discard(key)
+        else:
+            self.index[key] = path
+            self.by_prefix.setdefault(self._prefix(key), set()).add(key)
+
+    def _load(self):
+        """
+        读取索引文件：每行一条{"key", "path"}记录，path为null表示删除，后面的记录覆盖前面的；
+        兼容旧版本整体保存的JSON对象，读取后改写为新格式
+        """
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and set(data) != {"key", "path"}:
+            for key, path in data.items():
+                self._set(key, path)
+            self._compact()
+            return
+
+        lines = 0
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 写入过程中被中断的最后一行
+                continue
+            self._set(record["key"], record["path"])
+            lines += 1
+
+        # 覆盖和删除记录过多，或最后一行不完整时重写文件
+        if lines > 2 * len(self.index) + 100 or not text.endswith("\n"):
+            self._compact()
+
+    def _compact(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for key, path in self.index.items():
+                f.write(json.dumps({"key": key, "path": path}, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.index_path)
+
+    def _append(self, key, path):
+        """
+        修改索引并在索引文件末尾追加一条记录，不重写整个文件
+        """
+        self._set(key, path)
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"key": key, "path": path}, ensure_ascii=False) + "\n")
+
+    def has_candidates(self, size, head_digest, exclude=None):
+        """
+        是否存在大小和头部哈希都相同的已有文件
+
+        Args:
+            size (int): 文件大小
+            head_digest (str): 头部哈希
+            exclude (str, optional): 不作为候选的文件路径（当前任务自己的输出文件）
+
+        Returns:
+            bool: 是否值得继续获取尾部数据确认
+        """
+        with self.lock:
+            keys = self.by_prefix.get(f"{size}-{head_digest}", ())
+            return any(os.path.exists(self.index[key]) and not same_file(self.index[key], exclude)
+                       for key in keys)
+
+    def lookup(self, key, exclude=None):
+        """
+        查找指纹对应的已有文件
+
+        Args:
+            key (str): 内容指纹
+            exclude (str, optional): 不作为结果返回的文件路径（当前任务自己的输出文件）
+
+        Returns:
+            str or None: 已有文件路径，不存在、已被删除或为exclude时返回None
+        """
+        with self.lock:
+            path = self.index.get(key)
+            if path and not os.path.exists(path):
+                self._append(key, None)
+                return None
+            if same_file(path, exclude):
+                return None
+            return path
+
+    def add(self, key, path):
+        """
+        记录指纹对应的文件
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            if self.index.get(key) != path:
+                self._append(key, path)
+
+    @staticmethod
+    def link(existing_path, target_path):
+        """
+        将已有文件链接到新的输出路径，优先硬链接，跨磁盘时使用符号链接
+
+        Returns:
+            str or None: 使用的方式，两个路径已经是同一个文件时不做任何操作并返回None
+        """
+        if same_file(existing_path, target_path):
+            return None
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        try:
+            os.link(existing_path, target_path)
+            return "硬链接"
+        except OSError:
+            pass
+        try:
+            os.symlink(existing_path, target_path)
+            return "符号链接"
+        except OSError:
+            shutil.copy2(existing_path, target_path)
+            return "复制"
@@ -0,0 +1,160 @@
+import queue
+import threading
+
+from BilibiliDownloader import BilibiliDownloader
+from Config import load_config
+from Events import console_emitter
+
+
+class DownloadPipeline:
+    """
+    批量下载流水线
+    将下载、合并和后处理拆分为三个独立的线程池，通过有界队列连接：
+    一个视频在FFmpeg合并时，下一个视频的网络下载可以同时进行
+    """
+
+    def __init__(self, options=None, events=None, interactive=True):
+        """
+        初始化流水线
+
+        Args:
+            options (dict, optional): 配置项pipeline，缺省时从配置文件读取
+            events (EventEmitter, optional): 所有下载任务共用的事件分发器，缺省时使用命令行界面
+            interactive (bool): 准备阶段是否允许向用户提问
+        """
+        self.events = events or console_emitter()
+        self.interactive = interactive
+        if options is None:
+            options = load_config(self.events.log).get('pipeline', {})
+        self.download_workers = max(1, options.get('download_workers', 2))
+        self.merge_workers = max(1, options.get('merge_workers', 1))
+        self.post_workers = max(1, options.get('post_workers', 1))
+        self.queue_size = max(1, options.get('queue_size', 2))
+
+        self.results = {}
+        self.results_lock = threading.Lock()
+
+    def _set_result(self, downloader, job=None, error=None):
+        self._store_result(downloader.av_num, downloader.build_result(job, error))
+
+    def _set_failed_result(self, video_url, error):
+        """
+        记录创建下载器或准备阶段失败的视频，结果格式与build_result一致
+        """
+        self._store_result(video_url, {
+            "status": "failed",
+            "av_num": None,
+            "title": None,
+            "output_path": None,
+            "quality": None,
+            "quality_description": None,
+            "bytes_downloaded": 0,
+            "timings": {},
+            "side_artifacts": {},
+            "post_process": {},
+            "error": error
+        })
+
+    def _store_result(self, key, result):
+        with self.results_lock:
+            self.results[key] = result
+        self.events.emit("result", result=result)
+
+    def _stage_worker(self, stage, source, sink):
+        """
+        流水线阶段的工作线程：从source取出任务处理后放入sink
+
+        Args:
+            stage (str): 阶段名称：download、merge、post_process
+            source (queue.Queue): 输入队列，取到None时退出
+            sink (queue.Queue or None): 输出队列，最后一个阶段为None
+        """
+        while True:
+            item = source.get()
+            if item is None:
+                break
+
+            downloader, job = item
+            error = None
+            try:
+                proceed = downloader.run_stage(job, stage)
+            except Exception as e:
+                error = f"{stage}阶段出错: {e}"
+                # 后处理出错时视频已经完整生成，保留下载状态
+                if stage != "post_process":
+                    downloader.status = "failed"
+                self.events.log(f"[{downloader.av_num}] {error}", "error")
+                proceed = False
+
+            if proceed and sink is not None:
+                sink.put(item)
+                continue
+
+            try:
+                downloader.finish(job)
+            except Exception as e:
+                self.events.log(f"[{downloader.av_num}] 清理任务失败: {e}", "error")
+            self._set_result(downloader, job, error)
+
+    def _start_stage(self, stage, workers, source, sink):
+        threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._stage_worker,
+                args=(stage, source, sink),
+                name=f"{stage}-{index}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    @staticmethod
+    def _stop_stage(source, threads):
+        for _ in threads:
+            source.put(None)
+        for thread in threads:
+            thread.join()
+
+    def run(self, video_urls):
+        """
+        批量下载视频
+
+        Args:
+            video_urls (list): 视频的AV号、BV号或完整链接列表
+
+        Returns:
+            dict: AV/BV号（创建下载器或准备阶段失败时为传入的链接）-> 下载结果（格式见BilibiliDownloader.build_result）
+        """
+        download_queue = queue.Queue(maxsize=self.queue_size)
+        merge_queue = queue.Queue(maxsize=self.queue_size)
+        post_queue = queue.Queue(maxsize=self.queue_size)
+
+        download_threads = self._start_stage("download", self.download_workers, download_queue, merge_queue)
+        merge_threads = self._start_stage("merge", self.merge_workers, merge_queue, post_queue)
+        post_threads = self._start_stage("post_process", self.post_workers, post_queue, None)
+
+        # 准备阶段可能需要用户交互，在主线程中依次执行；下载队列已满时在此等待
+        for video_url in video_urls:
+            try:
+                downloader = BilibiliDownloader(video_url, events=self.events, interactive=self.interactive)
+                job = downloader.prepare()
+            except Exception as e:
+                error = f"准备下载失败: {e}"
+                self.events.log(f"{video_url}: {error}", "error")
+                self._set_failed_result(video_url, error)
+                continue
+            if not job:
+                self._set_result(downloader)
+                continue
+            download_queue.put((downloader, job))
+
+        # 上游阶段全部结束后再通知下游阶段退出
+        self._stop_stage(download_queue, download_threads)
+        self._stop_stage(merge_queue, merge_threads)
+        self._stop_stage(post_queue, post_threads)
+
+        self.events.log("批量下载结束:")
+        for av_num, result in self.results.items():
+            self.events.log(f"  {av_num}: {result['status']}")
+        return self.results
@@ -0,0 +1,183 @@
+import sys
+import threading
+import time
+
+from tqdm import tqdm
+
+
+class EventEmitter:
+    """
+    下载事件分发器
+    下载器通过事件报告日志和进度，命令行界面、服务端等调用方订阅事件后自行展示；
+    进度事件按时间间隔限流，避免每个数据块都触发回调
+    """
+
+    def __init__(self, progress_interval=0.2):
+        """
+        Args:
+            progress_interval (float): 同一进度条两次进度事件之间的最小间隔（秒）
+        """
+        self.progress_interval = progress_interval
+        self.subscribers = []
+        self._last_progress = {}
+        # 已报告过错误的(订阅者, 事件类型)，避免损坏的进度回调每次都输出错误
+        self._reported_errors = set()
+
+    def subscribe(self, callback):
+        """
+        订阅事件
+
+        Args:
+            callback (callable): 接收事件字典的回调函数
+
+        Returns:
+            callable: 传入的回调函数，便于之后取消订阅
+        """
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        取消订阅事件
+        """
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def emit(self, event_type, **data):
+        """
+        发送事件
+
+        Args:
+            event_type (str): 事件类型：log、progress_start、progress、progress_end、result
+            **data: 事件内容
+        """
+        event = {"type": event_type, "time": time.time()}
+        event.update(data)
+        for callback in list(self.subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                self._report_subscriber_error(callback, event_type, e)
+
+    def _report_subscriber_error(self, failed_callback, event_type, error):
+        """
+        订阅者处理事件出错时，向其他订阅者发送错误级别的日志事件；
+        没有其他订阅者时输出到标准错误。同一订阅者的同类事件只报告一次
+        """
+        error_key = (id(failed_callback), event_type)
+        if error_key in self._reported_errors:
+            return
+        self._reported_errors.add(error_key)
+
+        message = f"事件订阅者 {failed_callback!r} 处理{event_type}事件出错: {error!r}"
+        event = {"type": "log", "time": time.time(), "message": message, "level": "error"}
+        delivered = False
+        for callback in list(self.subscribers):
+            if callback is failed_callback:
+                continue
+            try:
+                callback(event)
+                delivered = True
+            except Exception:
+                pass
+        if not delivered:
+            print(message, file=sys.stderr)
+
+    def log(self, message, level="info"):
+        """
+        发送日志事件
+
+        Args:
+            message (str): 日志内容
+            level (str): 日志级别：info、warning、error
+        """
+        self.emit("log", message=message, level=level)
+
+    def progress_start(self, key, name, total, initial=0):
+        """
+        发送进度开始事件
+
+        Args:
+            key (str): 进度标识，同一时间唯一（通常为文件路径）
+            name (str): 显示名称
+            total (int): 总字节数，未知时为0
+            initial (int): 已完成的字节数（续传）
+        """
+        self._last_progress[key] = 0.0
+        self.emit("progress_start", key=key, name=name, total=total, downloaded=initial)
+
+    def progress(self, key, downloaded, total):
+        """
+        发送进度事件，距离上次事件不足progress_interval时直接忽略
+
+        Args:
+            key (str): 进度标识
+            downloaded (int): 已完成的字节数
+            total (int): 总字节数
+        """
+        now = time.monotonic()
+        if now - self._last_progress.get(key, 0.0) < self.progress_interval:
+            return
+        self._last_progress[key] = now
+        self.emit("progress", key=key, downloaded=downloaded, total=total)
+
+    def progress_end(self, key, downloaded, total, success=True):
+        """
+        发送进度结束事件，总会发送最终进度
+
+        Args:
+            key (str): 进度标识
+            downloaded (int): 已完成的字节数
+            total (int): 总字节数
+            success (bool): 是否成功完成
+        """
+        self._last_progress.pop(key, None)
+        self.emit("progress_end", key=key, downloaded=downloaded, total=total, success=success)
+
+
+class ConsoleSubscriber:
+    """
+    命令行界面：将日志事件输出到终端，将进度事件显示为tqdm进度条
+    """
+
+    def __init__(self):
+        self.bars = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        event_type = event["type"]
+        with self.lock:
+            if event_type == "log":
+                if self.bars:
+                    tqdm.write(event["message"])
+                else:
+                    print(event["message"])
+            elif event_type == "progress_start":
+                self.bars[event["key"]] = tqdm(
+                    total=event["total"],
+                    initial=event["downloaded"],
+                    unit="B",
+                    unit_scale=True,
+                    unit_divisor=1024,
+                    desc=event["name"]
+                )
+            elif event_type in ("progress", "progress_end"):
+                bar = self.bars.get(event["key"])
+                if bar is None:
+                    return
+                bar.update(event["downloaded"] - bar.n)
+                if event_type == "progress_end":
+                    bar.close()
+                    del self.bars[event["key"]]
+
+
+def console_emitter():
+    """
+    创建带命令行界面订阅者的事件分发器
+
+    Returns:
+        EventEmitter: 事件分发器
+    """
+    events = EventEmitter()
+    events.subscribe(ConsoleSubscriber())
+    return events
@@ -0,0 +1,459 @@
+import glob
+import itertools
+import os
+import re
+import struct
+import subprocess
+import time
+from datetime import datetime
+
+from BilibiliClient import BilibiliClient
+
+FLV_TAG_AUDIO = 8
+FLV_TAG_VIDEO = 9
+FLV_TAG_SCRIPT = 18
+
+# 连接持续录制超过该时长（秒）后视为稳定，重连计数清零
+STABLE_CONNECTION_SECONDS = 300
+
+
+class FlvSegmentWriter:
+    """
+    FLV流分段写入器
+    逐个解析FLV Tag并写入文件，按时长或大小在关键帧处切分文件；
+    每个分段都写入FLV头、元数据和音视频序列头，可以单独播放。
+    重连后自动跳过新连接的FLV头并修正时间戳，使录制内容连续
+    """
+
+    def __init__(self, path_factory, segment_ms=0, segment_bytes=0, log=print):
+        """
+        Args:
+            path_factory (callable): 返回新分段文件路径的函数
+            segment_ms (int): 分段时长（毫秒），0表示不按时长切分
+            segment_bytes (int): 分段大小（字节），0表示不按大小切分
+            log (callable): 日志输出函数
+        """
+        self.path_factory = path_factory
+        self.log = log
+        self.segment_ms = segment_ms
+        self.segment_bytes = segment_bytes
+
+        self.buffer = bytearray()
+        self.header_parsed = False
+        self.flv_flags = 0x05
+
+        # 新分段开头需要重复写入的Tag：元数据、视频序列头、音频序列头
+        self.script_tag = None
+        self.video_sequence_tag = None
+        self.audio_sequence_tag = None
+
+        # 时间戳修正：raw + connection_offset 为连续的时间线
+        self.connection_offset = None
+        self.last_timestamp = None
+        self.segment_start = 0
+
+        self.file = None
+        self.segment_path = None
+        self.segment_written = 0
+        self.segments = []
+        self.total_bytes = 0
+
+    def new_connection(self):
+        """
+        开始处理新的连接（重连后调用），新连接会重新发送FLV头和序列头
+        """
+        self.buffer = bytearray()
+        self.header_parsed = False
+        self.connection_offset = None
+
+    def feed(self, chunk):
+        """
+        输入从网络接收的数据块
+
+        Args:
+            chunk (bytes): 原始FLV数据
+        """
+        self.buffer += chunk
+        position = 0
+
+        if not self.header_parsed:
+            if len(self.buffer) < 13:
+                return
+            if self.buffer[:3] != b'FLV':
+                raise Exception("直播流不是有效的FLV格式")
+            self.flv_flags = self.buffer[4]
+            header_size = struct.unpack('>I', self.buffer[5:9])[0]
+            position = header_size + 4
+            self.header_parsed = True
+
+        while len(self.buffer) - position >= 11:
+            tag_type = self.buffer[position] & 0x1f
+            data_size = int.from_bytes(self.buffer[position + 1:position + 4], 'big')
+            tag_end = position + 11 + data_size + 4
+            if len(self.buffer) < tag_end:
+                break
+            timestamp = (int.from_bytes(self.buffer[position + 4:position + 7], 'big') |
+                         (self.buffer[position + 7] << 24))
+            data = bytes(self.buffer[position + 11:position + 11 + data_size])
+            self._handle_tag(tag_type, timestamp, data)
+            position = tag_end
+
+        # 只保留未处理完的数据，内存占用与录制时长无关
+        del self.buffer[:position]
+
+    def _handle_tag(self, tag_type, timestamp, data):
+        if tag_type == FLV_TAG_SCRIPT:
+            self.script_tag = data
+            return
+
+        if tag_type == FLV_TAG_VIDEO and len(data) > 1 and data[1] == 0:
+            if data == self.video_sequence_tag and self.file:
+                return
+            self.video_sequence_tag = data
+            if self.file:
+                self._write_tag(tag_type, self._segment_timestamp(self.last_timestamp or 0), data)
+            return
+
+        if tag_type == FLV_TAG_AUDIO and len(data) > 1 and (data[0] >> 4) == 10 and data[1] == 0:
+            if data == self.audio_sequence_tag and self.file:
+                return
+            self.audio_sequence_tag = data
+            if self.file:
+                self._write_tag(tag_type, self._segment_timestamp(self.last_timestamp or 0), data)
+            return
+
+        if tag_type not in (FLV_TAG_AUDIO, FLV_TAG_VIDEO):
+            return
+
+        # 新连接的第一个Tag接在已录制内容之后
+        if self.connection_offset is None:
+            next_timestamp = self.last_timestamp + 1 if self.last_timestamp is not None else 0
+            self.connection_offset = next_timestamp - timestamp
+        continuous = max(0, timestamp + self.connection_offset)
+
+        has_video = bool(self.flv_flags & 0x01)
+        is_boundary = (data[0] >> 4) == 1 if tag_type == FLV_TAG_VIDEO else not has_video
+        if is_boundary and (self.file is None or self._segment_full(continuous)):
+            self._open_segment(continuous)
+
+        if self.file:
+            self._write_tag(tag_type, self._segment_timestamp(continuous), data)
+            self.last_timestamp = continuous
+
+    def _segment_full(self, continuous):
+        if self.segment_ms and continuous - self.segment_start >= self.segment_ms:
+            return True
+        if self.segment_bytes and self.segment_written >= self.segment_bytes:
+            return True
+        return False
+
+    def _segment_timestamp(self, continuous):
+        return max(0, continuous - self.segment_start)
+
+    def _open_segment(self, continuous):
+        self.close()
+        self.segment_path = self.path_factory()
+        self.file = open(self.segment_path, 'wb')
+        self.segment_start = continuous
+        self.segment_written = 0
+        self.segments.append(self.segment_path)
+        self.log(f"开始写入分段: {self.segment_path}")
+
+        header = b'FLV' + bytes([1, self.flv_flags]) + struct.pack('>I', 9) + struct.pack('>I', 0)
+        self.file.write(header)
+        self.segment_written += len(header)
+        for tag_type, data in ((FLV_TAG_SCRIPT, self.script_tag),
+                               (FLV_TAG_VIDEO, self.video_sequence_tag),
+                               (FLV_TAG_AUDIO, self.audio_sequence_tag)):
+            if data:
+                self._write_tag(tag_type, 0, data)
+
+    def _write_tag(self, tag_type, timestamp, data):
+        header = bytes([tag_type]) + len(data).to_bytes(3, 'big') + \
+            (timestamp & 0xffffff).to_bytes(3, 'big') + bytes([(timestamp >> 24) & 0xff]) + b'\x00\x00\x00'
+        self.file.write(header)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', 11 + len(data)))
+        written = 11 + len(data) + 4
+        self.segment_written += written
+        self.total_bytes += written
+
+    def close(self):
+        """
+        关闭当前分段文件
+        """
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class BilibiliLiveRecorder(BilibiliClient):
+    """
+    B站直播录制器
+    与视频下载器共用BilibiliClient的会话、Cookie和FFmpeg处理，录制直播间的FLV/HLS直播流，
+    支持按时长或大小切分文件以及断线自动重连
+    """
+
+    def __init__(self, room_url, cookie_path=None, events=None, interactive=True):
+        """
+        初始化直播录制器
+
+        Args:
+            room_url (str): 直播间号或直播间链接
+            cookie_path (str, optional): Cookie文件路径
+            events (EventEmitter, optional): 事件分发器，缺省时使用命令行界面输出日志
+            interactive (bool): 是否允许通过input()向用户提问
+        """
+        self.room_id = self._extract_room_id(room_url.strip())
+
+        # 加载配置、初始化请求会话并验证FFmpeg（HLS直播流需要FFmpeg录制）
+        super().__init__(cookie_path, events, interactive)
+
+        # 提取配置项
+        live_options = self.config.get('live', {})
+        self.segment_minutes = live_options.get('segment_minutes', 60)
+        self.segment_size_mb = live_options.get('segment_size_mb', 0)
+        self.live_quality = live_options.get('quality', 10000)
+        self.reconnect_delay = live_options.get('reconnect_delay', 5)
+        self.max_reconnect = live_options.get('max_reconnect', 0)
+        self.wait_for_live = live_options.get('wait_for_live', False)
+        self.read_timeout = live_options.get('read_timeout', 30)
+
+    @staticmethod
+    def _extract_room_id(room_url):
+        """
+        从输入字符串中提取直播间号
+
+        Raises:
+            ValueError: 当无法提取到有效的直播间号时
+        """
+        match = re.search(r'live\.bilibili\.com/(?:h5/)?(\d+)', room_url)
+        if match:
+            return match.group(1)
+        if re.match(r'^\d+$', room_url):
+            return room_url
+        raise ValueError("无法从输入中提取有效的直播间号")
+
+    def get_room_info(self):
+        """
+        获取直播间信息
+
+        Returns:
+            dict: 包含真实房间号room_id、主播uid、主播名称uname、标题title和是否开播live
+        """
+        response = self.session.get("https://api.live.bilibili.com/room/v1/Room/get_info",
+                                    params={"room_id": self.room_id}, timeout=10)
+        data = response.json()
+        if data["code"] != 0:
+            raise Exception(f"获取直播间信息失败: {data.get('message')}")
+
+        info = {
+            "room_id": data["data"]["room_id"],
+            "uid": data["data"]["uid"],
+            "title": data["data"].get("title", ""),
+            "live": data["data"]["live_status"] == 1,
+            "uname": "未知主播"
+        }
+        try:
+            response = self.session.get("https://api.live.bilibili.com/live_user/v1/Master/info",
+                                        params={"uid": info["uid"]}, timeout=10)
+            info["uname"] = response.json()["data"]["info"]["uname"]
+        except Exception:
+            pass
+        return info
+
+    def get_stream_url(self, room_id):
+        """
+        获取直播流地址，优先使用HTTP-FLV，其次使用HLS
+
+        Args:
+            room_id (int): 真实房间号
+
+        Returns:
+            tuple: (流类型flv/hls, 流地址)
+        """
+        params = {
+            "room_id": room_id,
+            "protocol": "0,1",
+            "format": "0,1,2",
+            "codec": "0,1",
+            "qn": self.live_quality,
+            "platform": "web",
+            "ptype": 8
+        }
+        response = self.session.get("https://api.live.bilibili.com/xlive/web-room/v2/index/getRoomPlayInfo",
+                                    params=params, timeout=10)
+        data = response.json()
+        if data["code"] != 0:
+            raise Exception(f"获取直播流地址失败: {data.get('message')}")
+
+        playurl_info = data["data"].get("playurl_info")
+        if not playurl_info:
+            raise Exception("直播间未开播或无法获取直播流")
+
+        candidates = {}
+        for stream in playurl_info["playurl"]["stream"]:
+            for fmt in stream["format"]:
+                for codec in fmt["codec"]:
+                    url_info = codec["url_info"][0]
+                    url = url_info["host"] + codec["base_url"] + url_info["extra"]
+                    candidates.setdefault((fmt["format_name"], codec["codec_name"]), url)
+
+        for fmt, stream_type in (("flv", "flv"), ("ts", "hls"), ("fmp4", "hls")):
+            for codec_name in ("avc", "hevc"):
+                if (fmt, codec_name) in candidates:
+                    return stream_type, candidates[(fmt, codec_name)]
+        raise Exception("未找到可用的直播流格式")
+
+    def _record_flv(self, writer, url):
+        """
+        录制一次HTTP-FLV连接，连接断开时返回
+        """
+        writer.new_connection()
+        with self.session.get(url, stream=True, timeout=(10, self.read_timeout)) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1024 * 64):
+                if chunk:
+                    writer.feed(chunk)
+
+    def _record_hls(self, record_dir, file_prefix, url, segments):
+        """
+        使用FFmpeg录制一次HLS连接，按时长切分文件，连接断开时返回
+
+        Args:
+            record_dir (str): 录制目录
+            file_prefix (str): 文件名前缀
+            url (str): 直播流地址
+            segments (list): FFmpeg本次写入的分段文件路径会追加到该列表
+        """
+        pattern = os.path.join(glob.escape(record_dir), f"{glob.escape(file_prefix)}_*.ts")
+        existing = set(glob.glob(pattern))
+
+        header_lines = "".join(f"{k}: {v}\r\n" for k, v in self.headers.items())
+        cmd = [
+            self._ffmpeg_exe(),
+            "-headers", header_lines,
+            "-i", url,
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(int(self.segment_minutes * 60) or 86400),
+            "-reset_timestamps", "1",
+            "-strftime", "1",
+            "-loglevel", "error",
+            os.path.join(record_dir, f"{file_prefix}_%Y%m%d_%H%M%S.ts")
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        finally:
+            # 连接中断或按Ctrl+C停止时同样记录已写入的分段
+            segments.extend(sorted(set(glob.glob(pattern)) - existing))
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg错误输出: {result.stderr.strip()}")
+
+    def run(self):
+        """
+        执行录制流程，直播结束或按Ctrl+C时停止
+
+        Returns:
+            dict: 录制结果，包含status、segments（分段文件路径列表）、bytes_written和error
+        """
+        writer = None
+        hls_segments = []
+        status = "completed"
+        error = None
+        try:
+            room_info = self.get_room_info()
+            while not room_info["live"]:
+                if not self.wait_for_live:
+                    self._log("直播间未开播")
+                    return self._finish_recording(writer, hls_segments, "skipped", error)
+                self._log(f"直播间未开播，{self.reconnect_delay * 6}秒后重新检查")
+                time.sleep(self.reconnect_delay * 6)
+                room_info = self.get_room_info()
+
+            safe_uname = re.sub(r'[\/:*?"<>|]', '_', room_info["uname"])
+            record_dir = os.path.join(self.base_download_dir, "live", f"{safe_uname}_{room_info['uid']}")
+            os.makedirs(record_dir, exist_ok=True)
+            file_prefix = f"{room_info['room_id']}"
+            self._log(f"直播标题: {room_info['title']}, 主播: {room_info['uname']}，录制文件将保存到: {record_dir}")
+
+            # 按大小切分时同一秒内可能产生多个分段，文件名加上序号避免覆盖
+            segment_index = itertools.count(1)
+
+            def next_segment_path():
+                return os.path.join(record_dir,
+                                    f"{file_prefix}_{datetime.now():%Y%m%d_%H%M%S}_{next(segment_index):03d}.flv")
+
+            writer = FlvSegmentWriter(next_segment_path,
+                                      segment_ms=int(self.segment_minutes * 60 * 1000),
+                                      segment_bytes=int(self.segment_size_mb * 1024 * 1024),
+                                      log=self._log)
+
+            reconnects = 0
+            size_notice_logged = False
+            while True:
+                connected_at = time.monotonic()
+                try:
+                    stream_type, url = self.get_stream_url(room_info["room_id"])
+                    if stream_type == "flv":
+                        self._record_flv(writer, url)
+                    else:
+                        if self.segment_size_mb and not size_notice_logged:
+                            self._log("HLS直播流仅支持按时长切分，segment_size_mb配置将被忽略")
+                            size_notice_logged = True
+                        self._record_hls(record_dir, file_prefix, url, hls_segments)
+                except Exception as e:
+                    self._log(f"直播流连接中断: {e}")
+
+                # 直播仍在进行时重新获取地址并重连
+                try:
+                    room_info = self.get_room_info()
+                except Exception as e:
+                    self._log(f"检查直播状态失败: {e}")
+                if not room_info["live"]:
+                    self._log("直播已结束")
+                    break
+
+                # 只限制连续的重连次数，稳定录制一段时间后偶尔断线不计入
+                if time.monotonic() - connected_at >= STABLE_CONNECTION_SECONDS:
+                    reconnects = 0
+                reconnects += 1
+                if self.max_reconnect and reconnects > self.max_reconnect:
+                    self._log(f"已达到最大重连次数: {self.max_reconnect}")
+                    break
+                self._log(f"{self.reconnect_delay}秒后重新连接（第{reconnects}次）")
+                time.sleep(self.reconnect_delay)
+
+        except KeyboardInterrupt:
+            self._log("\n已停止录制")
+        except Exception as e:
+            status = "failed"
+            error = str(e)
+            self._log(f"录制失败: {e}")
+        finally:
+            if writer:
+                writer.close()
+        return self._finish_recording(writer, hls_segments, status, error)
+
+    def _finish_recording(self, writer, hls_segments, status, error):
+        """
+        生成录制结果并发送结果事件
+
+        Args:
+            writer (FlvSegmentWriter or None): HTTP-FLV录制使用的分段写入器
+            hls_segments (list): FFmpeg录制HLS直播流写入的分段文件路径
+            status (str): 录制状态
+            error (str or None): 错误信息
+        """
+        hls_bytes = sum(os.path.getsize(path) for path in hls_segments if os.path.exists(path))
+        result = {
+            "status": status,
+            "room_id": self.room_id,
+            "segments": (list(writer.segments) if writer else []) + list(hls_segments),
+            "bytes_written": (writer.total_bytes if writer else 0) + hls_bytes,
+            "error": error
+        }
+        if result["segments"]:
+            self._log(f"共录制 {len(result['segments'])} 个分段，{result['bytes_written'] / 1024 ** 2:.1f}MB")
+        self.events.emit("result", result=result)
+        return result
@@ -0,0 +1,198 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SideArtifactFetcher:
+    """
+    附属资源下载器
+    与主视频流并行下载字幕、弹幕XML和封面，复用下载器已解析的页面信息
+    """
+
+    def __init__(self, session, av_num, cid, initial_state=None, html_tree=None, options=None, log=print):
+        """
+        初始化附属资源下载器
+
+        Args:
+            session (requests.Session): 复用的请求会话
+            av_num (str): 视频AV/BV号
+            cid (str): 视频CID
+            initial_state (dict, optional): 页面中解析出的__INITIAL_STATE__
+            html_tree (lxml.etree._Element, optional): 已解析的页面HTML树
+            options (dict, optional): 配置项side_artifacts，控制下载哪些资源
+            log (callable): 日志输出函数
+        """
+        self.session = session
+        self.av_num = av_num
+        self.cid = cid
+        self.initial_state = initial_state or {}
+        self.html_tree = html_tree
+        self.options = options or {}
+        self.log = log
+        self.executor = None
+        self.futures = {}
+
+    def enabled(self):
+        """
+        是否启用了任意一种附属资源
+
+        Returns:
+            bool: 是否需要下载附属资源
+        """
+        return any(self.options.get(name) for name in ('subtitle', 'danmaku', 'cover'))
+
+    def start(self, save_dir, base_name):
+        """
+        在后台线程中开始下载附属资源，不阻塞主视频流下载
+
+        Args:
+            save_dir (str): 保存目录
+            base_name (str): 文件名前缀（不含扩展名）
+        """
+        if not self.enabled():
+            return
+
+        tasks = {
+            'subtitle': self.fetch_subtitles,
+            'danmaku': self.fetch_danmaku,
+            'cover': self.fetch_cover
+        }
+        self.executor = ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="side-artifact")
+        for name, task in tasks.items():
+            if self.options.get(name):
+                self.futures[name] = self.executor.submit(task, save_dir, base_name)
+
+    def wait(self):
+        """
+        等待所有附属资源下载完成并输出结果
+
+        Returns:
+            dict: 资源名称 -> 保存的文件路径列表
+        """
+        results = {}
+        if self.executor is None:
+            return results
+
+        for name, future in self.futures.items():
+            try:
+                results[name] = future.result()
+                for path in results[name]:
+                    self.log(f"附属资源已保存: {path}")
+            except Exception as e:
+                results[name] = []
+                self.log(f"下载{name}失败: {e}")
+
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        self.futures = {}
+        return results
+
+    def _video_data(self):
+        return self.initial_state.get('videoData', {}) if isinstance(self.initial_state, dict) else {}
+
+    @staticmethod
+    def _normalize_url(url):
+        if url.startswith('//'):
+            return 'https:' + url
+        if url.startswith('http://'):
+            return 'https://' + url[len('http://'):]
+        return url
+
+    def fetch_subtitles(self, save_dir, base_name):
+        """
+        下载CC字幕并转换为SRT格式
+
+        Returns:
+            list: 保存的字幕文件路径
+        """
+        subtitles = self._video_data().get('subtitle', {}).get('list') or []
+
+        # 页面未内嵌字幕地址时（通常需要登录），通过播放器接口获取
+        if not any(item.get('subtitle_url') for item in subtitles):
+            params = {"cid": self.cid}
+            if self.av_num.startswith('av'):
+                params["aid"] = self.av_num[2:]
+            else:
+                params["bvid"] = self.av_num
+            response = self.session.get("https://api.bilibili.com/x/player/v2", params=params, timeout=10)
+            data = response.json()
+            if data["code"] != 0:
+                raise Exception(f"获取字幕列表失败: {data.get('message')}")
+            subtitles = data["data"].get("subtitle", {}).get("subtitles") or []
+
+        saved = []
+        for item in subtitles:
+            subtitle_url = item.get('subtitle_url')
+            if not subtitle_url:
+                continue
+            response = self.session.get(self._normalize_url(subtitle_url), timeout=10)
+            response.raise_for_status()
+            body = response.json().get('body', [])
+
+            path = os.path.join(save_dir, f"{base_name}.{item.get('lan', 'unknown')}.srt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._to_srt(body))
+            saved.append(path)
+        return saved
+
+    @staticmethod
+    def _to_srt(body):
+        """
+        将B站字幕JSON的body转换为SRT文本
+        """
+        def fmt(seconds):
+            millis = int(round(float(seconds) * 1000))
+            hours, millis = divmod(millis, 3600000)
+            minutes, millis = divmod(millis, 60000)
+            secs, millis = divmod(millis, 1000)
+            return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+        lines = []
+        for index, line in enumerate(body, start=1):
+            lines.append(str(index))
+            lines.append(f"{fmt(line['from'])} --> {fmt(line['to'])}")
+            lines.append(line.get('content', ''))
+            lines.append('')
+        return '\n'.join(lines)
+
+    def fetch_danmaku(self, save_dir, base_name):
+        """
+        下载弹幕XML
+
+        Returns:
+            list: 保存的弹幕文件路径
+        """
+        response = self.session.get("https://api.bilibili.com/x/v1/dm/list.so",
+                                    params={"oid": self.cid}, timeout=10)
+        response.raise_for_status()
+
+        path = os.path.join(save_dir, f"{base_name}.danmaku.xml")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        return [path]
+
+    def fetch_cover(self, save_dir, base_name):
+        """
+        下载视频封面
+
+        Returns:
+            list: 保存的封面文件路径
+        """
+        cover_url = self._video_data().get('pic')
+        if not cover_url and self.html_tree is not None:
+            for query in ('//meta[@property="og:image"]/@content', '//meta[@itemprop="image"]/@content'):
+                elements = self.html_tree.xpath(query)
+                if elements:
+                    cover_url = elements[0].strip().split('@')[0]
+                    break
+        if not cover_url:
+            raise Exception("页面中未找到封面地址")
+
+        cover_url = self._normalize_url(cover_url)
+        ext = os.path.splitext(cover_url.split('?')[0])[1] or '.jpg'
+        response = self.session.get(cover_url, timeout=10)
+        response.raise_for_status()
+
+        path = os.path.join(save_dir, f"{base_name}.cover{ext}")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        return [path]
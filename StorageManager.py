@@ -0,0 +1,188 @@
+import os
+import shutil
+import threading
+import time
+
+
+class StorageManager:
+    """
+    磁盘空间准入控制
+    下载前根据流的大小检查目标磁盘剩余空间，空间不足时等待其他任务释放空间
+    同一进程内的多个下载任务共享预留记录，避免同时开始导致合并阶段空间不足；
+    已经写入磁盘的部分会反映在剩余空间中，检查时只扣除各任务尚未写入的预留
+    """
+
+    # 尚未释放的空间预留
+    _reservations = []
+    _condition = threading.Condition()
+
+    def __init__(self, options=None, log=print):
+        """
+        初始化磁盘空间管理器
+
+        Args:
+            options (dict, optional): 配置项storage
+            log (callable): 日志输出函数
+        """
+        options = options or {}
+        self.log = log
+        self.reserve_bytes = int(options.get('reserve_mb', 512)) * 1024 * 1024
+        self.wait_for_space = options.get('wait_for_space', True)
+        self.wait_timeout = options.get('wait_timeout', 3600)
+        self.poll_interval = options.get('poll_interval', 30)
+
+    @staticmethod
+    def estimate_stream_size(stream, duration=None):
+        """
+        估算单个流的大小
+
+        Args:
+            stream (dict): playurl返回的流信息
+            duration (int, optional): 视频时长（秒），流缺少size字段时用码率估算
+
+        Returns:
+            int: 估算的字节数，无法估算时返回0
+        """
+        if stream.get("size"):
+            return int(stream["size"])
+        if duration and stream.get("bandwidth"):
+            return int(stream["bandwidth"] * duration / 8)
+        return 0
+
+    @staticmethod
+    def _device(directory):
+        os.makedirs(directory, exist_ok=True)
+        return os.stat(directory).st_dev
+
+    def _outstanding(self, device):
+        """
+        其他任务在指定磁盘上尚未写入的预留字节数
+        """
+        return sum(reservation._outstanding(device) for reservation in self._reservations)
+
+    def _fits(self, needs):
+        """
+        检查各磁盘在扣除其他任务预留后是否满足需求
+
+        Args:
+            needs (dict): st_dev -> (目录, 需要的字节数)
+
+        Returns:
+            tuple: (是否满足, 不满足时的说明)
+        """
+        for device, (directory, need) in needs.items():
+            free = shutil.disk_usage(directory).free - self._outstanding(device)
+            if free < need + self.reserve_bytes:
+                return False, (f"{directory} 剩余空间 {free / 1024 ** 3:.2f}GB，"
+                               f"需要 {(need + self.reserve_bytes) / 1024 ** 3:.2f}GB")
+        return True, ""
+
+    def acquire(self, requirements):
+        """
+        申请磁盘空间，空间不足时按配置等待
+
+        Args:
+            requirements (list): [(目录, 需要的字节数), ...]，同一磁盘上的需求会累加
+
+        Returns:
+            StorageReservation: 空间预留凭据，任务结束后调用release释放
+
+        Raises:
+            Exception: 空间不足且不等待或等待超时
+        """
+        needs = {}
+        for directory, size in requirements:
+            device = self._device(directory)
+            previous = needs.get(device, (directory, 0))[1]
+            needs[device] = (directory, previous + size)
+
+        deadline = time.monotonic() + self.wait_timeout if self.wait_timeout else None
+        waited = False
+        with self._condition:
+            while True:
+                fits, reason = self._fits(needs)
+                if fits:
+                    break
+                if not self.wait_for_space:
+                    raise Exception(f"磁盘空间不足: {reason}")
+
+                remaining = deadline - time.monotonic() if deadline else self.poll_interval
+                if remaining <= 0:
+                    raise Exception(f"等待磁盘空间超时: {reason}")
+                if not waited:
+                    self.log(f"磁盘空间不足，等待空间释放: {reason}")
+                    waited = True
+                # 其他任务释放预留时会被唤醒，同时定期重新检查磁盘实际剩余空间
+                self._condition.wait(min(self.poll_interval, remaining))
+
+            reservation = StorageReservation(self, {device: need for device, (_, need) in needs.items()})
+            self._reservations.append(reservation)
+        return reservation
+
+    def _release(self, reservation):
+        with self._condition:
+            if reservation in self._reservations:
+                self._reservations.remove(reservation)
+            self._condition.notify_all()
+
+
+class StorageReservation:
+    """
+    磁盘空间预留凭据
+    通过track登记任务写入的文件，已写入的字节会从预留中扣除，避免与磁盘剩余空间重复计算
+    """
+
+    def __init__(self, manager, amounts):
+        self.manager = manager
+        self.amounts = amounts
+        # 登记的文件路径 -> (st_dev, 登记时已有的字节数)
+        self.paths = {}
+
+    @staticmethod
+    def _written(path):
+        """
+        文件及其下载临时文件（.part）当前的字节数
+        """
+        size = 0
+        for candidate in (path, path + ".part"):
+            try:
+                size += os.path.getsize(candidate)
+            except OSError:
+                pass
+        return size
+
+    def track(self, path):
+        """
+        登记任务将要写入的文件
+
+        Args:
+            path (str): 文件路径，续传的.part临时文件会一并统计
+        """
+        device = StorageManager._device(os.path.dirname(os.path.abspath(path)))
+        with StorageManager._condition:
+            self.paths[path] = (device, self._written(path))
+
+    def _outstanding(self, device):
+        """
+        在指定磁盘上尚未写入的预留字节数
+        """
+        need = self.amounts.get(device, 0)
+        if not need:
+            return 0
+        written = sum(max(0, self._written(path) - initial)
+                      for path, (path_device, initial) in self.paths.items() if path_device == device)
+        return max(0, need - written)
+
+    def release(self):
+        """
+        释放预留的空间，可重复调用
+        """
+        if self.amounts:
+            self.manager._release(self)
+            self.amounts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
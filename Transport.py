@@ -0,0 +1,246 @@
+import socket
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family, create_connection
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+except ImportError:
+    httpx = None
+
+
+class DnsCache:
+    """
+    传输层内部的DNS缓存
+    只作用于Transport创建的连接，在ttl秒内复用解析结果，避免每个视频都重新解析API和CDN域名；
+    不修改socket.getaddrinfo，不影响同一进程内的其他库
+    """
+
+    def __init__(self, ttl):
+        """
+        Args:
+            ttl (int): 缓存秒数
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """
+        解析主机地址
+
+        Args:
+            host (str): 主机名
+            port (int): 端口
+
+        Returns:
+            list: IP地址列表，解析失败时返回空列表，由调用方按原有逻辑处理
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        try:
+            infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+        except OSError:
+            return []
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host, port):
+        """
+        删除缓存的解析结果（缓存的地址全部无法连接时调用）
+        """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+class _CachedDnsConnectionMixin:
+    """
+    通过DnsCache解析主机地址的urllib3连接；缓存的地址都无法连接时，
+    删除缓存并交给urllib3重新解析，错误处理与原来一致
+    """
+
+    dns_cache = None
+
+    def _new_conn(self):
+        for address in self.dns_cache.resolve(self._dns_host, self.port):
+            try:
+                return create_connection((address, self.port), self.timeout,
+                                         source_address=self.source_address,
+                                         socket_options=self.socket_options)
+            except OSError:
+                continue
+        self.dns_cache.invalidate(self._dns_host, self.port)
+        return super()._new_conn()
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    """
+    使用DnsCache解析主机地址的HTTPAdapter
+    """
+
+    def __init__(self, dns_cache, **kwargs):
+        """
+        Args:
+            dns_cache (DnsCache): DNS缓存
+            **kwargs: 传递给HTTPAdapter的参数
+        """
+        # HTTPAdapter.__init__会调用init_poolmanager，需要先设置dns_cache
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {"dns_cache": self.dns_cache}
+        http_connection = type("CachedDnsHTTPConnection", (_CachedDnsConnectionMixin, HTTPConnection), attrs)
+        https_connection = type("CachedDnsHTTPSConnection", (_CachedDnsConnectionMixin, HTTPSConnection), attrs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("CachedDnsHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": http_connection}),
+            "https": type("CachedDnsHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": https_connection})
+        }
+
+
+class Transport:
+    """
+    共享的网络传输层
+    同一进程内的下载任务共享连接池和DNS缓存（仅作用于本传输层的连接）；获取到CDN地址后立即在后台预先建立连接，
+    可选通过HTTP/2复用API请求的连接
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, options=None):
+        """
+        Args:
+            options (dict, optional): 配置项transport
+        """
+        options = options or {}
+        self.prewarm_enabled = options.get('prewarm', True)
+        self.pool_maxsize = options.get('pool_maxsize', 32)
+        self.http2 = options.get('http2', False) and httpx is not None
+
+        # 所有会话共用同一个连接池，连接不携带Cookie，不同账号的会话也可以安全复用
+        dns_cache_ttl = options.get('dns_cache_ttl', 300)
+        if dns_cache_ttl:
+            self.adapter = CachedDnsAdapter(DnsCache(dns_cache_ttl), pool_connections=16,
+                                            pool_maxsize=self.pool_maxsize)
+        else:
+            self.adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.pool_maxsize)
+        # 仅用于预热连接，不携带Cookie；各下载任务通过new_session创建自己的会话
+        self._prewarm_session = self.new_session()
+
+        # 会话 -> (HTTP/2客户端, 已同步的Cookie)，会话被回收时自动关闭对应的客户端
+        self._http2_clients = weakref.WeakKeyDictionary()
+        self._http2_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, options=None, log=print):
+        """
+        获取进程内共享的传输层实例，配置以第一次调用为准
+
+        Args:
+            options (dict, optional): 配置项transport
+            log (callable): 日志输出函数
+
+        Returns:
+            Transport: 传输层
+        """
+        if (options or {}).get('http2') and httpx is None:
+            log("未安装httpx[http2]，API请求将继续使用HTTP/1.1")
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(options)
+            return cls._instance
+
+    def new_session(self):
+        """
+        创建使用共享连接池的会话，Cookie和请求头属于各自的会话
+
+        Returns:
+            requests.Session: 会话
+        """
+        session = requests.Session()
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        return session
+
+    def _http2_client(self, session):
+        """
+        获取会话对应的HTTP/2客户端，并将会话中新增或变化的Cookie（如SESSDATA）同步到客户端；
+        客户端自己收到的Cookie（如buvid3）保留不变
+        """
+        with self._http2_lock:
+            entry = self._http2_clients.get(session)
+            if entry is None:
+                client = httpx.Client(http2=True, follow_redirects=True, headers=dict(session.headers))
+                weakref.finalize(session, client.close)
+                # 已同步到客户端的会话Cookie：(名称, 域名, 路径) -> 值
+                entry = (client, {})
+                self._http2_clients[session] = entry
+            client, synced = entry
+            for cookie in session.cookies:
+                cookie_key = (cookie.name, cookie.domain, cookie.path)
+                if synced.get(cookie_key) != cookie.value:
+                    client.cookies.set(cookie.name, cookie.value, domain=cookie.domain, path=cookie.path)
+                    synced[cookie_key] = cookie.value
+        return client
+
+    def api_get(self, session, url, **kwargs):
+        """
+        发送API请求，启用HTTP/2时多个请求复用同一个连接
+
+        Args:
+            session (requests.Session): 提供请求头和Cookie的会话
+            url (str): 请求地址
+            **kwargs: 请求参数（HTTP/2仅支持params、headers和timeout）
+
+        Returns:
+            requests.Response or httpx.Response: 响应
+        """
+        if self.http2 and set(kwargs) <= {"params", "headers", "timeout"}:
+            return self._http2_client(session).get(url, **kwargs)
+        return session.get(url, **kwargs)
+
+    def prewarm(self, urls):
+        """
+        在后台线程中预先完成DNS解析和TLS握手，建立的连接放回连接池供随后的下载复用
+
+        Args:
+            urls (list): 即将下载的地址，同一主机只预热一次
+        """
+        if not self.prewarm_enabled:
+            return
+
+        origins = {}
+        for url in urls:
+            parts = urlsplit(url)
+            origins.setdefault(f"{parts.scheme}://{parts.netloc}", url)
+
+        for url in origins.values():
+            threading.Thread(target=self._warm, args=(url,), name="prewarm", daemon=True).start()
+
+    def _warm(self, url):
+        headers = {
+            "Range": "bytes=0-0",
+            "Referer": "https://www.bilibili.com/",
+            "Origin": "https://www.bilibili.com"
+        }
+        try:
+            self._prewarm_session.get(url, headers=headers, timeout=5).close()
+        except Exception:
+            pass